@@ -0,0 +1,63 @@
+import math
+import threading
+
+####################################################################
+# Admission control in front of the prediction path: at most       #
+# max_concurrent requests run, at most max_queue wait for them and #
+# requests that would miss their deadline are rejected right away #
+####################################################################
+class AdmissionController:
+    def __init__(self, max_queue:int, max_concurrent:int, default_deadline_ms:float, ewma_alpha:float):
+        self.max_queue = int(max_queue)
+        self.max_concurrent = int(max_concurrent)
+        self.default_deadline = float(default_deadline_ms) / 1000.0
+        self.alpha = float(ewma_alpha)
+        self.slots = threading.Semaphore(self.max_concurrent)
+        self.lock = threading.Lock()
+        self.waiting = 0
+        self.running = 0
+        # Exponentially weighted moving average of the time (s) a request holds its slot
+        self.service_time = 0.0
+        self.admitted = 0
+        self.shed = {'queue-full': 0, 'deadline': 0, 'timeout': 0}
+
+    # Returns None once the request holds a slot, or the seconds the client should wait before retrying
+    def enter(self, deadline_ms:float=None):
+        deadline = float(deadline_ms) / 1000.0 if deadline_ms else self.default_deadline
+        with self.lock:
+            wait = self._estimated_wait()
+            if self.waiting >= self.max_queue:
+                return self._reject('queue-full', wait)
+            if wait + self.service_time > deadline:
+                return self._reject('deadline', wait)
+            self.waiting = self.waiting + 1
+        acquired = self.slots.acquire(timeout=deadline)
+        with self.lock:
+            self.waiting = self.waiting - 1
+            if not acquired:
+                return self._reject('timeout', self._estimated_wait())
+            self.running = self.running + 1
+            self.admitted = self.admitted + 1
+        return None
+
+    # seconds: time the request held its slot
+    def leave(self, seconds:float):
+        with self.lock:
+            self.running = self.running - 1
+            self.service_time = self.service_time + self.alpha * (seconds - self.service_time)
+        self.slots.release()
+
+    def occupancy(self):
+        with self.lock:
+            return self.waiting, self.running
+
+    # Must be called holding self.lock. Requests ahead are served max_concurrent at a time
+    def _estimated_wait(self):
+        if self.running < self.max_concurrent:
+            return 0.0
+        return self.service_time * (self.waiting // self.max_concurrent + 1)
+
+    # Must be called holding self.lock
+    def _reject(self, reason:str, wait:float):
+        self.shed[reason] = self.shed[reason] + 1
+        return max(1, math.ceil(wait))
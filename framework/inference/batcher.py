@@ -0,0 +1,79 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+import metrics
+
+##################################################################
+# Collects concurrent requests for one neural network and runs a #
+# single predict over the stacked batch                           #
+##################################################################
+class MicroBatcher:
+    def __init__(self, model, max_batch_size:int, max_wait_ms:float):
+        self.model = model
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = float(max_wait_ms) / 1000.0
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.closed = False
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+    # Blocks until the rows of data have been predicted and returns their softmax output
+    def predict(self, data:np.ndarray):
+        future = Future()
+        with self.lock:
+            queued = not self.closed
+            if queued:
+                self.queue.put((data, future))
+        if queued:
+            return future.result()
+        with metrics.timed('predict'):
+            return self.model.predict(data)
+
+    def queue_depth(self):
+        return self.queue.qsize()
+
+    # Pending requests are still served before the worker stops
+    def close(self):
+        with self.lock:
+            if not self.closed:
+                self.closed = True
+                self.queue.put(None)
+
+    def _run(self):
+        running = True
+        while running:
+            item = self.queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    running = False
+                    break
+                batch.append(item)
+            self._flush(batch)
+
+    def _flush(self, batch:list):
+        try:
+            inputs = np.concatenate([data for data, _ in batch], axis=0)
+            with metrics.timed('predict'):
+                result = self.model.predict(inputs, batch_size=len(inputs))
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        offset = 0
+        for data, future in batch:
+            future.set_result(result[offset:offset + len(data)])
+            offset = offset + len(data)
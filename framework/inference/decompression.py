@@ -0,0 +1,101 @@
+import io
+import zlib
+import numpy as np
+import nnUtils as nn
+
+# zstd is optional: without the zstandard package only gzip and deflate bodies are accepted
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+TOO_LARGE = "TooLarge"
+CHUNK_SIZE = 64 * 1024
+
+def supported_encodings():
+    return ['gzip', 'deflate'] + (['zstd'] if zstandard is not None else [])
+
+####################################################################
+# gzip (several members allowed) or deflate (zlib format) stream,  #
+# decompressed on demand: read(size) never expands more than size  #
+# bytes, whatever the compression ratio of the body                #
+####################################################################
+class ZlibReader:
+    def __init__(self, stream, wbits:int):
+        self.stream = stream
+        self.wbits = wbits
+        self.decoder = zlib.decompressobj(wbits)
+        self.pending = b''
+
+    def read(self, size:int):
+        while True:
+            if self.decoder.eof:
+                # Next gzip member, if any
+                self.pending = self.decoder.unused_data
+                if not self.pending:
+                    self.pending = self.stream.read(CHUNK_SIZE)
+                if not self.pending:
+                    return b''
+                self.decoder = zlib.decompressobj(self.wbits)
+            if not self.pending:
+                self.pending = self.stream.read(CHUNK_SIZE)
+                if not self.pending:
+                    raise EOFError('Truncated compressed body')
+            data = self.decoder.decompress(self.pending, size)
+            self.pending = self.decoder.unconsumed_tail
+            if data:
+                return data
+
+def open_decoder(stream, encoding:str):
+    if encoding == 'gzip':
+        return ZlibReader(stream, 16 + zlib.MAX_WBITS)
+    if encoding == 'deflate':
+        return ZlibReader(stream, zlib.MAX_WBITS)
+    return zstandard.ZstdDecompressor().stream_reader(stream, read_across_frames=True)
+
+# Whole decompressed body, written chunk by chunk into a single buffer that becomes the returned bytes.
+# Returns TOO_LARGE as soon as it expands over max_bytes, ERROR if it is not valid
+def read_decompressed(app, stream, encoding:str, max_bytes:int):
+    buffer = io.BytesIO()
+    try:
+        decoder = open_decoder(stream, encoding)
+        while True:
+            chunk = decoder.read(min(CHUNK_SIZE, max_bytes + 1 - buffer.tell()))
+            if not chunk:
+                break
+            buffer.write(chunk)
+            if buffer.tell() > max_bytes:
+                app.logger.info('Decompressed body is larger than ' + str(max_bytes) + ' bytes')
+                return TOO_LARGE
+    except (zlib.error, EOFError, _zstd_error()) as e:
+        app.logger.info('Invalid ' + encoding + ' body: ' + str(e))
+        return nn.ERROR
+    return buffer.getvalue()
+
+# Decompressed body of exactly nbytes bytes, written straight into the array it is parsed from.
+# Returns ERROR if it is not valid or does not have that size
+def read_decompressed_into(app, stream, encoding:str, nbytes:int):
+    buffer = np.empty(nbytes, dtype=np.uint8)
+    filled = 0
+    try:
+        decoder = open_decoder(stream, encoding)
+        while True:
+            # One byte more than missing, to detect bodies longer than expected
+            chunk = decoder.read(min(CHUNK_SIZE, nbytes + 1 - filled))
+            if not chunk:
+                break
+            if filled + len(chunk) > nbytes:
+                app.logger.info('Decompressed body is larger than ' + str(nbytes) + ' bytes')
+                return nn.ERROR
+            buffer[filled:filled + len(chunk)] = np.frombuffer(chunk, dtype=np.uint8)
+            filled = filled + len(chunk)
+    except (zlib.error, EOFError, _zstd_error()) as e:
+        app.logger.info('Invalid ' + encoding + ' body: ' + str(e))
+        return nn.ERROR
+    if filled != nbytes:
+        app.logger.info('Decompressed body has ' + str(filled) + ' bytes, expected ' + str(nbytes))
+        return nn.ERROR
+    return buffer
+
+def _zstd_error():
+    return zstandard.ZstdError if zstandard is not None else zlib.error
@@ -0,0 +1,88 @@
+# exportArtifact.py - packs a trained neural network into a single model.artifact file
+import os, sys, json, io, zipfile, datetime, argparse
+import numpy as np
+import tensorflow as tf
+from flask import Flask
+from keras.models import model_from_json
+import nnUtils as nn
+
+# main_path = os.getcwd() + '/TFG'
+main_path = '/TFG'
+nn_path = main_path + '/framework/inference/neuralNetworks'
+config_path = main_path + '/framework/inference/config.json'
+server_env = os.environ.get('ENV') or "LOCAL"
+
+# Model from a training outcome folder (best weights if model checkpoints were used)
+def load_trained_model(outcome_path:str):
+    with open(outcome_path + '/model.json', 'r') as json_file:
+        model = model_from_json(json_file.read())
+    if os.path.exists(outcome_path + '/best_weights.index'):
+        model.load_weights(outcome_path + '/best_weights')
+    else:
+        model.load_weights(outcome_path + '/model.h5')
+    return model
+
+# Preprocessing parameters: window shape and movements from the training configuration,
+# sensors and FFT from the inference configuration
+def build_info(train_cfg:dict, inference_info:dict):
+    info = dict(inference_info)
+    info["rows"] = train_cfg["input-rows"]
+    info["columns"] = train_cfg["input-columns"] // 3 if info["FFT"] else train_cfg["input-columns"]
+    info["channels"] = train_cfg["channels"]
+    info["movementsList"] = train_cfg["movements"]
+    return info
+
+# TensorFlow Lite graph with a fixed window shape (only the batch size is free)
+def convert_model(model, info:dict):
+    columns = info["columns"] * 3 if info["FFT"] else info["columns"]
+    signature = tf.TensorSpec([None, info["rows"], columns, info["channels"]], tf.float32)
+    serve = tf.function(lambda x: model(x, training=False), input_signature=[signature])
+    converter = tf.lite.TFLiteConverter.from_concrete_functions([serve.get_concrete_function()])
+    return converter.convert()
+
+##########
+#  Main  #
+##########
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export a trained neural network as a single artifact')
+    parser.add_argument('outcome', help='Training outcome folder (model.json, best_weights or model.h5 and config.json)')
+    parser.add_argument('name', help='Identifier of the neural network in framework/inference/neuralNetworks')
+    parser.add_argument('--warmup-sample', help='CSV window used to warm the neural network up (zeros by default)')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    with open(config_path) as f:
+        inference_info = json.load(f)[server_env]["info"]
+    with open(args.outcome + '/config.json') as f:
+        info = build_info(json.load(f), inference_info)
+
+    if args.warmup_sample:
+        with open(args.warmup_sample, 'rb') as f:
+            warmup_sample = nn.parse_csv_window(app, f.read(), info)
+        if str(warmup_sample) == nn.ERROR:
+            sys.exit('The warm-up sample does not match the neural network input')
+    else:
+        warmup_sample = np.zeros((info["rows"], info["columns"]), dtype=np.float32)
+
+    model = load_trained_model(args.outcome)
+    tflite_model = convert_model(model, info)
+    manifest = {
+        "format-version": nn.ARTIFACT_FORMAT_VERSION,
+        "name": args.name,
+        "created": str(datetime.datetime.now()),
+        "tensorflow-version": tf.__version__,
+        "info": info,
+        "warmup-prediction": model.predict(nn.process_input_data(info, warmup_sample, app)).tolist()
+    }
+    warmup_file = io.BytesIO()
+    np.save(warmup_file, warmup_sample)
+
+    os.makedirs(nn_path + '/' + args.name, exist_ok=True)
+    artifact_path = nn.artifact_path(args.name, nn_path)
+    # The TensorFlow Lite graph is already dense: store it uncompressed so loading is a plain read
+    with zipfile.ZipFile(artifact_path + '.tmp', 'w', compression=zipfile.ZIP_STORED) as artifact:
+        artifact.writestr('manifest.json', json.dumps(manifest, indent=3))
+        artifact.writestr('model.tflite', tflite_model)
+        artifact.writestr('warmup.npy', warmup_file.getvalue())
+    os.replace(artifact_path + '.tmp', artifact_path)
+    print('Artifact written to ' + artifact_path)
@@ -1,12 +1,19 @@
 # app.py - a minimal flask api
-from flask import Flask, request, jsonify, make_response
-import requests, json, jwt, time, sys, os, logging
-from flask_restful import Resource, Api
+import time
+# Startup timings are measured from here. TensorFlow is not imported until the warm-up
+launch_time = time.time()
+from flask import Flask, request, jsonify, make_response, g
+import json, sys, os, logging
 from logging.config import dictConfig
 import nnUtils as nn
+from modelRegistry import ModelRegistry
+from sessions import SessionManager
+from predictionCache import PredictionCache, window_key
+from admission import AdmissionController
+import decompression
+import metrics
 import io
-import csv
-import codecs
+import threading
 import numpy as np
 
 
@@ -20,18 +27,165 @@ log_level = os.environ.get('LOG_LEVEL') or logging.INFO
 server_port = os.environ.get('SERVER_PORT') or 8082
 server_env = os.environ.get('ENV') or "LOCAL"
 defualt_nn =  os.environ.get('DEFAULT_NN') or "N5-250-28-9-1"
+serving_backend = os.environ.get('SERVING_BACKEND') or "keras"
 f = open(config_path,)
 cfg = json.load(f)
 cfg_data = cfg[server_env]["info"]
+model_variant = os.environ.get('MODEL_VARIANT') or cfg[server_env]["serving"]["model-variant"]
+memory_budget_mb = os.environ.get('MODEL_MEMORY_BUDGET_MB') or cfg[server_env]["model-memory-budget-mb"]
+background_warm_up = (os.environ.get('BACKGROUND_WARM_UP') or str(cfg[server_env]["serving"]["background-warm-up"])).lower() == "true"
+hot_reload_cfg = cfg[server_env]["hot-reload"]
+max_expanded_bytes = int(cfg[server_env]["uploads"]["max-expanded-mb"] * 1024 * 1024)
 # Launch server
 cli = sys.modules['flask.cli']
 cli.show_server_banner = lambda *x: None
 
 app = Flask(__name__)
-api = Api(app)
 app.logger.setLevel(log_level)
 
-app.logger.info('Launching inference server')
+app.logger.info('Launching inference server (modules imported in ' + str(round(time.time() - launch_time, 2)) + ' s)')
+# Neural networks exported as a single artifact are loaded from it, k-fold ensembles as a single graph
+def load_network(app, name:str, nn_path:str):
+    if os.path.exists(nn.artifact_path(name, nn_path)):
+        return nn.load_artifact_network(app, name, nn_path)
+    if os.path.exists(nn.ensemble_path(name, nn_path)):
+        return nn.load_ensemble_network(app, name, nn_path)
+    if model_variant != "float" and os.path.exists(nn.quantized_path(name, nn_path, model_variant)):
+        return nn.load_quantized_network(app, name, nn_path, model_variant)
+    if serving_backend == "tflite":
+        return nn.load_tflite_network(app, name, nn_path)
+    return nn.load_nueral_network(app, name, nn_path)
+
+registry = ModelRegistry(app, nn_path, memory_budget_mb, cfg[server_env]["batching"], cfg[server_env]["concurrency"], load_network)
+ready = threading.Event()
+
+# Preprocessing parameters of a resident neural network. The default one falls back to info in config.json
+def model_info(resident):
+    if resident.info is None and resident.name == defualt_nn:
+        return cfg_data
+    return resident.info
+
+# Whether a neural network has preprocessing parameters (info.json, an artifact or info in config.json), checked on
+# its files so a network that cannot be used is never built
+def has_info(name:str):
+    return name == defualt_nn or os.path.exists(nn.info_path(name, nn_path)) or os.path.exists(nn.artifact_path(name, nn_path))
+
+# Runs a first prediction through a resident neural network (also used before swapping in a reloaded one)
+def warm_up_resident(resident):
+    info = model_info(resident)
+    if info is None:
+        app.logger.warning('Neural network ' + resident.name + ' has no info.json, requests for it will be rejected')
+        return
+    columns = int(info["columns"]) * 3 if info["FFT"] else int(info["columns"])
+    resident.batcher.predict(np.zeros((1, int(info["rows"]), columns, 1), dtype=np.float32))
+
+# Loads a neural network and warms it up
+def warm_up_model(name:str):
+    start = time.time()
+    warm_up_resident(registry.get(name))
+    app.logger.info('Neural network ' + name + ' warmed up in ' + str(round(time.time() - start, 2)) + ' s')
+
+# The default neural network must be ready; the other hosted ones are loaded too if possible
+def warm_up():
+    start = time.time()
+    nn.tensorflow()
+    app.logger.info('TensorFlow imported in ' + str(round(time.time() - start, 2)) + ' s')
+    warm_up_model(defualt_nn)
+    ready.set()
+    app.logger.info('Server ready ' + str(round(time.time() - launch_time, 2)) + ' s after launch')
+    # The neural networks of an enabled cascade are hosted too
+    names = cfg[server_env]["hosted-models"] + (cascade_cfg["stages"] if cascade_cfg["enabled"] else [])
+    for name in sorted(set(names), key=names.index):
+        if name == defualt_nn:
+            continue
+        try:
+            warm_up_model(name)
+        except Exception:
+            app.logger.exception('Neural network ' + name + ' could not be loaded')
+sessions = SessionManager(cfg[server_env]["sessions"])
+cache_cfg = cfg[server_env]["prediction-cache"]
+cache = PredictionCache(cache_cfg["max-entries"], cache_cfg["ttl-seconds"]) if cache_cfg["enabled"] else None
+cascade_cfg = cfg[server_env]["cascade"]
+cascade_answers = {name: 0 for name in cascade_cfg["stages"]}
+cascade_lock = threading.Lock()
+admission_cfg = cfg[server_env]["admission"]
+admission = AdmissionController(admission_cfg["max-queue"], admission_cfg["max-concurrent"], admission_cfg["default-deadline-ms"], admission_cfg["ewma-alpha"])
+metrics.collector.gauge('inference_queue_depth', 'Requests waiting in the micro-batcher of each resident neural network',
+    lambda: [({'model': resident.name}, resident.batcher.queue_depth()) for resident in registry.residents()])
+metrics.collector.gauge('inference_resident_model_bytes', 'Memory of the resident neural networks',
+    lambda: [({'model': resident.name}, resident.nbytes) for resident in registry.residents()])
+metrics.collector.gauge('inference_retiring_model_bytes', 'Memory of the replaced neural network versions still finishing their requests',
+    lambda: [({'model': resident.name, 'loaded_at': repr(resident.loaded_at)}, resident.nbytes) for resident in registry.retiring_residents()])
+metrics.collector.gauge('inference_open_sessions', 'Open streaming sessions', lambda: [({}, sessions.count())])
+if cache is not None:
+    metrics.collector.counter('inference_prediction_cache_requests_total', 'Prediction cache lookups by result',
+        lambda: [({'result': 'hit'}, cache.hits), ({'result': 'miss'}, cache.misses), ({'result': 'coalesced'}, cache.coalesced)])
+    metrics.collector.gauge('inference_prediction_cache_entries', 'Predictions kept in the cache', lambda: [({}, cache.size())])
+metrics.collector.counter('inference_cascade_windows_total', 'Windows answered by each neural network of the cascade',
+    lambda: [({'model': name}, value) for name, value in cascade_answers.items()])
+metrics.collector.gauge('inference_admission_requests', 'Requests waiting for and holding a prediction slot',
+    lambda: [({'state': state}, value) for state, value in zip(['waiting', 'running'], admission.occupancy())])
+metrics.collector.gauge('inference_admission_service_seconds', 'Moving average of the time a request holds its prediction slot',
+    lambda: [({}, admission.service_time)])
+metrics.collector.counter('inference_admission_admitted_total', 'Requests admitted to the prediction path', lambda: [({}, admission.admitted)])
+metrics.collector.counter('inference_admission_shed_total', 'Requests rejected by admission control by reason',
+    lambda: [({'reason': reason}, value) for reason, value in admission.shed.items()])
+
+# Endpoints answered while the default neural network is warming up (liveness, configuration and metrics)
+cold_endpoints = {'get_status', 'get_ready', 'get_config', 'get_metrics', 'list_all_neural_networks', 'close_session'}
+
+@app.before_request
+def reject_until_ready():
+    if not ready.is_set() and request.endpoint not in cold_endpoints:
+        data = {'message': 'Neural network warming up', 'code': 'FAILED'}
+        response = make_response(jsonify(data), 503)
+        response.headers['Retry-After'] = '1'
+        return response
+
+# Endpoints that load neural networks or predict go through admission control. Clients can set
+# their deadline (ms) in the X-Request-Deadline-Ms header, admission.default-deadline-ms otherwise
+admitted_endpoints = {'inference', 'timeline', 'open_session', 'push_frames', 'get_model'}
+
+@app.before_request
+def admit_request():
+    if request.endpoint not in admitted_endpoints:
+        return None
+    retry_after = admission.enter(request.headers.get('X-Request-Deadline-Ms', type=float))
+    if retry_after is not None:
+        data = {'message': 'Server overloaded, try again later', 'code': 'FAILED'}
+        response = make_response(jsonify(data), 503)
+        response.headers['Retry-After'] = str(retry_after)
+        return response
+    g.admitted_at = time.monotonic()
+
+@app.teardown_request
+def leave_admission(exception):
+    admitted_at = g.pop('admitted_at', None)
+    if admitted_at is not None:
+        admission.leave(time.monotonic() - admitted_at)
+
+# Neural network versions used by the request (see select_model), released when it finishes
+@app.teardown_request
+def release_models(exception):
+    for resident in g.pop('residents', []):
+        registry.checkin(resident)
+
+# Background warm-up, so the port is bound (and liveness answered) while TensorFlow and the model load
+def start_warm_up():
+    try:
+        warm_up()
+    except Exception:
+        app.logger.exception('Warm-up of ' + defualt_nn + ' failed, the server will not become ready')
+
+# Watcher of the folders of the resident networks (one per process: each preforkServer.py worker polls on its own)
+def start_hot_reload():
+    if hot_reload_cfg["enabled"]:
+        threading.Thread(target=registry.watch, args=(hot_reload_cfg["poll-seconds"], warm_up_resident), daemon=True).start()
+
+@app.after_request
+def count_response(response):
+    metrics.count(response.status_code)
+    return response
 
 #####################
 # Get server status #
@@ -41,6 +195,17 @@ def get_status():
     data = {'message': 'Server is online', 'code': 'SUCCESS'}
     return make_response(jsonify(data), 201)
 
+###################################################
+# Get server readiness (default NN warmed up)     #
+###################################################
+@app.route('/api/ready', methods=['GET'])
+def get_ready():
+    if not ready.is_set():
+        data = {'message': 'Neural network warming up', 'code': 'FAILED'}
+        return make_response(jsonify(data), 503)
+    data = {'message': 'Server is ready', 'code': 'SUCCESS'}
+    return make_response(jsonify(data), 200)
+
 #################################
 # Get selected NN configuration #
 #################################
@@ -48,6 +213,15 @@ def get_status():
 def get_config():
     return make_response(jsonify(cfg[server_env]), 201)
 
+###########################################
+# Get metrics (Prometheus text format)    #
+###########################################
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    response = make_response(metrics.collector.render(), 200)
+    response.headers['Content-Type'] = metrics.CONTENT_TYPE
+    return response
+
 ############################
 # List all neural networks #
 ############################
@@ -56,36 +230,392 @@ def list_all_neural_networks():
     _, folders, files = next(os.walk(nn_path))
     return '\n'.join(folders)
 
+########################################################
+# Get the preprocessing parameters of a neural network #
+########################################################
+@app.route('/api/models/<name>', methods=['GET'])
+def get_model(name):
+    resident, info, error = select_model(name)
+    if error is not None:
+        return error
+    data = {'model': name, 'info': info, 'code': 'SUCCESS'}
+    return make_response(jsonify(data), 200)
+
+##########################################################
+# Rebuild a neural network from its files and swap it in #
+##########################################################
+@app.route('/api/models/<name>/reload', methods=['POST'])
+def reload_model(name):
+    if not registry.exists(name):
+        data = {'message': 'Unknown neural network ' + name, 'code': 'FAILED'}
+        return make_response(jsonify(data), 404)
+    try:
+        resident = registry.reload(name, warm_up_resident)
+    except Exception:
+        app.logger.exception('Neural network ' + name + ' could not be reloaded')
+        data = {'message': 'Neural network ' + name + ' could not be reloaded, the previous version is still served', 'code': 'FAILED'}
+        return make_response(jsonify(data), 500)
+    data = {'model': name, 'loaded_at': resident.loaded_at, 'bytes': resident.nbytes, 'code': 'SUCCESS'}
+    return make_response(jsonify(data), 200)
+
+# Resident neural network requested (the default one if none). Returns it with its info or the error response.
+# The request keeps that version until it finishes, even if the network is reloaded meanwhile
+def select_model(name:str=None):
+    name = name or request.args.get('model') or defualt_nn
+    if not registry.exists(name):
+        data = {'message': 'Unknown neural network ' + name, 'code': 'FAILED'}
+        return None, None, make_response(jsonify(data), 404)
+    if not has_info(name):
+        data = {'message': 'Neural network ' + name + ' has no info.json', 'code': 'FAILED'}
+        return None, None, make_response(jsonify(data), 422)
+    resident = registry.checkout(name)
+    g.setdefault('residents', []).append(resident)
+    info = model_info(resident)
+    if info is None:
+        data = {'message': 'Neural network ' + name + ' has no info.json', 'code': 'FAILED'}
+        return None, None, make_response(jsonify(data), 422)
+    return resident, info, None
+
+# Result of compute (which returns the result or the error response) for data, from the cache if enabled.
+# The model load time is part of the key, so a reloaded neural network never reuses old predictions
+def cached(key_id:str, data:np.ndarray, compute, *extra):
+    if cache is None:
+        return compute()
+    return cache.get_or_compute(window_key(key_id, data, *extra), compute)
+
+def resident_id(resident):
+    return resident.name + '@' + repr(resident.loaded_at)
+
+def busy_response(resident):
+    data = {'message': 'Too many requests for neural network ' + resident.name, 'code': 'FAILED'}
+    return make_response(jsonify(data), 429)
+
+# Body of the request (or of an uploaded file), decompressed while it is read if it has a Content-Encoding.
+# nbytes is its decompressed size if known, so it is written straight into the array parsed from it.
+# Returns the body or the error response
+def read_body(stream, encoding:str, nbytes:int=None):
+    if encoding == 'identity':
+        return stream.read(), None
+    if encoding not in decompression.supported_encodings():
+        data = {'message': 'Unsupported Content-Encoding ' + encoding + ', use ' + ', '.join(decompression.supported_encodings()), 'code': 'FAILED'}
+        return None, make_response(jsonify(data), 415)
+    if nbytes is not None and nbytes <= max_expanded_bytes:
+        body = decompression.read_decompressed_into(app, stream, encoding, nbytes)
+    else:
+        body = decompression.read_decompressed(app, stream, encoding, max_expanded_bytes)
+    if isinstance(body, str) and body == decompression.TOO_LARGE:
+        data = {'message': 'Uploads must not expand over ' + str(max_expanded_bytes) + ' bytes', 'code': 'FAILED'}
+        return None, make_response(jsonify(data), 413)
+    if isinstance(body, str):
+        data = {'message': 'Invalid ' + encoding + ' body', 'code': 'FAILED'}
+        return None, make_response(jsonify(data), 400)
+    return body, None
+
+def content_encoding(headers):
+    return headers.get('Content-Encoding', 'identity').strip().lower()
+
+# Size of a raw tensor body from its headers, None if they are not valid (parse_binary_tensor reports it)
+def binary_size():
+    dtype = request.headers.get('X-Tensor-Dtype', 'float32')
+    try:
+        shape = [int(dim) for dim in request.headers.get('X-Tensor-Shape').split(',')]
+    except (AttributeError, ValueError):
+        return None
+    if dtype not in nn.BINARY_DTYPES or any(dim <= 0 for dim in shape):
+        return None
+    return int(np.prod(shape)) * np.dtype(nn.BINARY_DTYPES[dtype]).itemsize
+
+# Binary bodies carry their shape (and dtype) in the request headers. Returns the window or the error response
+def read_binary_window(info:dict, fixed_rows:bool):
+    encoding = content_encoding(request.headers)
+    if request.mimetype == nn.NPY_MIMETYPE:
+        body, error = read_body(request.stream, encoding)
+        return (None, error) if error is not None else (nn.parse_npy_tensor(app, body, info, fixed_rows), None)
+    body, error = read_body(request.stream, encoding, binary_size())
+    if error is not None:
+        return None, error
+    return nn.parse_binary_tensor(app, body, request.headers.get('X-Tensor-Dtype', 'float32'), request.headers.get('X-Tensor-Shape'), info, fixed_rows), None
+
+# Uploaded data (binary body or CSV file). Returns the data or the error response
+def read_upload(info:dict, fixed_rows:bool=True):
+    with metrics.timed('parse'):
+        return parse_upload(info, fixed_rows)
+
+# CSV windows come as a data_file form upload or as the whole body (text/csv). Both, as well as
+# binary bodies, can be compressed (Content-Encoding of the request or of the uploaded file)
+def parse_upload(info:dict, fixed_rows:bool):
+    if request.mimetype in (nn.BINARY_MIMETYPE, nn.NPY_MIMETYPE):
+        data, error = read_binary_window(info, fixed_rows)
+        if error is not None:
+            return None, error
+        if str(data) == nn.SHAPE_MISMATCH:
+            rows = str(info["rows"]) + ' rows and ' if fixed_rows else ''
+            data = {'message': 'The tensor must have ' + rows + str(info["columns"]) + ' columns (' + str(int(info["columns"]) * 3) + ' with the FFT)', 'code': 'FAILED'}
+            return None, make_response(jsonify(data), 422)
+        if str(data) == nn.ERROR:
+            data = {'message': 'Invalid tensor upload', 'code': 'FAILED'}
+            return None, make_response(jsonify(data), 400)
+        return data, None
+    if request.mimetype == nn.CSV_MIMETYPE:
+        body, error = read_body(request.stream, content_encoding(request.headers))
+    else:
+        try:
+            flask_file = request.files['data_file']
+        except:
+            data = {'message': 'Upload a CSV file', 'code': 'FAILED'}
+            return None, make_response(jsonify(data), 400)
+        body, error = read_body(flask_file.stream, content_encoding(flask_file.headers))
+    if error is not None:
+        return None, error
+    data = nn.parse_csv_window(app, body, info, fixed_rows)
+    if str(data) == nn.ERROR:
+        data = {'message': 'Invalid 2D data format', 'code': 'FAILED'}
+        return None, make_response(jsonify(data), 422)
+    return data, None
+
+# Predicts several windows in a single batch. Returns the movement of each window
+def predict_windows(resident, info:dict, windows:list):
+    batch = []
+    for window in windows:
+        with metrics.timed('process_input'):
+            data = nn.process_input_data(info, window, app)
+        if str(data) == nn.ERROR:
+            return nn.ERROR
+        batch.append(data)
+    result = resident.batcher.predict(np.concatenate(batch))
+    return [info["movementsList"][index] for index in np.argmax(result, axis=1)]
+
+# Returns the movements of one window or the error response
+def predict_window(resident, info:dict, data:np.ndarray):
+    if not resident.acquire():
+        return None, busy_response(resident)
+    try:
+        movements = predict_windows(resident, info, [data])
+    finally:
+        resident.release()
+    if str(movements) == nn.ERROR:
+        data = {'message': 'Invalid 2D data format', 'code': 'FAILED'}
+        return None, make_response(jsonify(data), 422)
+    return movements, None
+
 ############################
 # Infer movement from csv #
 ############################
 @app.route('/api/inference', methods=['POST'])
 def inference():
     app.logger.info('New image recieved')
+    if cascade_requested():
+        return cascade_inference()
+    resident, info, error = select_model()
+    if error is not None:
+        return error
+    data, error = read_upload(info)
+    if error is not None:
+        return error
+    movements, error = cached(resident_id(resident), data, lambda: predict_window(resident, info, data))
+    if error is not None:
+        return error
+    data = {'message': 'The performed movement is: ' + movements[0], 'code': 'SUCCESS'}
+    return make_response(jsonify(data), 200)
+
+# Softmax output of raw windows (windows x rows x columns) or the error response
+def predict_raw(resident, info:dict, windows:np.ndarray):
+    with metrics.timed('process_input'):
+        batch = nn.process_input_batch(info, windows)
+    if not resident.acquire():
+        return None, busy_response(resident)
     try:
-        flask_file = request.files['data_file']
-    except:
-        data = {'message': 'Upload a CSV file', 'code': 'FAILED'}
+        return resident.batcher.predict(batch), None
+    finally:
+        resident.release()
+
+# Softmax output of every window of a recording or the error response. predict is called for each batch of windows
+def predict_recording(predict, rows:int, recording:np.ndarray, hop:int):
+    batch_size = cfg[server_env]["timeline"]["batch-size"]
+    windows = nn.sliding_windows(recording, rows, hop)
+    results = []
+    for start in range(0, len(windows), batch_size):
+        output, error = predict(windows[start:start + batch_size])
+        if error is not None:
+            return None, error
+        results.append(output)
+    return np.concatenate(results), None
+
+####################################################################
+# Cascade: every neural network but the last one only answers the  #
+# windows it predicts with a top probability over the threshold;   #
+# the rest are escalated to the next (larger) neural network       #
+####################################################################
+# An enabled cascade without stages is ignored (the shipped config does not name any)
+def cascade_requested():
+    return cascade_cfg["enabled"] and len(cascade_cfg["stages"]) > 0 and request.args.get('model', 'cascade') == 'cascade'
+
+# Resident neural networks of the cascade with their info, or the error response
+def cascade_stages():
+    stages = []
+    for name in cascade_cfg["stages"]:
+        resident, info, error = select_model(name)
+        if error is not None:
+            return None, error
+        stages.append((resident, info))
+    first = stages[0][1]
+    for _, info in stages[1:]:
+        if int(info["rows"]) != int(first["rows"]) or int(info["columns"]) != int(first["columns"]) or info["movementsList"] != first["movementsList"]:
+            data = {'message': 'The neural networks of the cascade do not share their window shape and movements', 'code': 'FAILED'}
+            return None, make_response(jsonify(data), 500)
+    return stages, None
+
+def cascade_id(stages:list):
+    return 'cascade:' + str(cascade_cfg["threshold"]) + ':' + '+'.join(resident_id(resident) for resident, _ in stages)
+
+def predict_cascade(stages:list, windows:np.ndarray):
+    threshold = float(cascade_cfg["threshold"])
+    pending = np.arange(len(windows))
+    results = None
+    for depth, (resident, info) in enumerate(stages):
+        output, error = predict_raw(resident, info, windows[pending])
+        if error is not None:
+            return None, error
+        if results is None:
+            results = np.empty((len(windows), output.shape[1]), dtype=np.float32)
+        results[pending] = output
+        if depth == len(stages) - 1:
+            answered = np.ones(len(pending), dtype=bool)
+        else:
+            answered = output.max(axis=1) >= threshold
+        with cascade_lock:
+            cascade_answers[resident.name] = cascade_answers[resident.name] + int(answered.sum())
+        app.logger.info('Cascade: ' + resident.name + ' answered ' + str(int(answered.sum())) + ' of ' + str(len(pending)) + ' windows, '
+            + str(int((~answered).sum())) + ' escalated (threshold ' + str(threshold) + ')')
+        pending = pending[~answered]
+        if len(pending) == 0:
+            break
+    return results, None
+
+# /api/inference through the cascade. Each neural network applies its own FFT, so windows must not include it
+def cascade_inference():
+    stages, error = cascade_stages()
+    if error is not None:
+        return error
+    info = stages[0][1]
+    data, error = read_upload(info)
+    if error is not None:
+        return error
+    if data.shape[1] != int(info["columns"]):
+        data = {'message': 'The cascade only accepts windows without the FFT', 'code': 'FAILED'}
+        return make_response(jsonify(data), 422)
+    results, error = cached(cascade_id(stages), data, lambda: predict_cascade(stages, data[np.newaxis]))
+    if error is not None:
+        return error
+    data = {'message': 'The performed movement is: ' + info["movementsList"][int(np.argmax(results[0]))], 'code': 'SUCCESS'}
+    return make_response(jsonify(data), 200)
+
+##############################################
+# Infer the movement timeline of a recording #
+##############################################
+@app.route('/api/timeline', methods=['POST'])
+def timeline():
+    app.logger.info('New recording recieved')
+    timeline_cfg = cfg[server_env]["timeline"]
+    hop = request.args.get('hop', default=timeline_cfg["hop-rows"], type=int)
+    smoothing = request.args.get('smoothing', default=1, type=int)
+    if hop <= 0 or smoothing <= 0:
+        data = {'message': 'hop and smoothing must be positive numbers', 'code': 'FAILED'}
         return make_response(jsonify(data), 400)
-    
-    data = []
-    stream = codecs.iterdecode(flask_file.stream, 'utf-8')
-    for row in csv.reader(stream, dialect=csv.excel):
-        if row:
-            data.append(row)
-    del data[0]
-    data = np.array(data)
-    data = data.astype(np.float)
-    data = nn.process_input_data(cfg_data, data, app)
-    if str(data) == nn.ERROR:
-        data = {'message': 'Invalid 2D data format', 'code': 'FAILED'}
+    if cascade_requested():
+        stages, error = cascade_stages()
+        if error is not None:
+            return error
+        name, info, key_id = 'cascade', stages[0][1], cascade_id(stages)
+        predict = lambda windows: predict_cascade(stages, windows)
+    else:
+        resident, info, error = select_model()
+        if error is not None:
+            return error
+        name, key_id = resident.name, resident_id(resident)
+        predict = lambda windows: predict_raw(resident, info, windows)
+    recording, error = read_upload(info, fixed_rows=False)
+    if error is not None:
+        return error
+    rows = int(info["rows"])
+    if recording.shape[1] != int(info["columns"]) or not rows <= len(recording) <= timeline_cfg["max-rows"]:
+        data = {'message': 'The recording must have ' + str(info["columns"]) + ' columns and between ' + str(rows) + ' and ' + str(timeline_cfg["max-rows"]) + ' rows', 'code': 'FAILED'}
+        return make_response(jsonify(data), 422)
+    results, error = cached(key_id, recording, lambda: predict_recording(predict, rows, recording, hop), 'timeline', hop)
+    if error is not None:
+        return error
+    indices = np.argmax(results, axis=1)
+    if smoothing > 1:
+        indices = nn.majority_vote(indices, len(info["movementsList"]), smoothing)
+    movements = [{'start': i * hop, 'end': i * hop + rows, 'movement': info["movementsList"][index],
+        'probability': float(results[i, index])} for i, index in enumerate(indices)]
+    data = {'timeline': movements, 'model': name, 'hop': hop, 'smoothing': smoothing, 'code': 'SUCCESS'}
+    return make_response(jsonify(data), 200)
+
+###############################
+# Open a streaming session    #
+###############################
+@app.route('/api/sessions', methods=['POST'])
+def open_session():
+    hop = request.args.get('hop', type=int)
+    if hop is not None and hop <= 0:
+        data = {'message': 'hop must be a positive number of rows', 'code': 'FAILED'}
+        return make_response(jsonify(data), 400)
+    resident, info, error = select_model()
+    if error is not None:
+        return error
+    session = sessions.open(resident.name, info, hop)
+    if session is None:
+        data = {'message': 'Too many open sessions', 'code': 'FAILED'}
+        return make_response(jsonify(data), 429)
+    data = {'session': session.id, 'model': session.model, 'rows': session.rows, 'hop': session.hop, 'code': 'SUCCESS'}
+    return make_response(jsonify(data), 201)
+
+###########################################
+# Push frames to a streaming session      #
+###########################################
+@app.route('/api/sessions/<session_id>/frames', methods=['POST'])
+def push_frames(session_id):
+    session = sessions.get(session_id)
+    if session is None:
+        data = {'message': 'Unknown or expired session', 'code': 'FAILED'}
+        return make_response(jsonify(data), 404)
+    resident, info, error = select_model(session.model)
+    if error is not None:
+        return error
+    frames, error = read_upload(info, fixed_rows=False)
+    if error is not None:
+        return error
+    if frames.shape[1] != int(info["columns"]):
+        data = {'message': 'Frames must have ' + str(info["columns"]) + ' columns', 'code': 'FAILED'}
         return make_response(jsonify(data), 422)
-    model = nn.load_nueral_network(app, defualt_nn, nn_path)
-    result = model.predict(data)
-    index = np.argmax(result)
-    predicted_movement =cfg_data["movementsList"][index]
-    data = {'message': 'The performed movement is: ' + predicted_movement, 'code': 'SUCCESS'}
+    # Frames are only consumed when they can be predicted, so a rejected push can be retried
+    if not resident.acquire():
+        return busy_response(resident)
+    try:
+        windows = session.push(frames)
+        movements = predict_windows(resident, info, windows) if windows else []
+    finally:
+        resident.release()
+    data = {'predictions': movements, 'buffered': session.filled, 'code': 'SUCCESS'}
+    return make_response(jsonify(data), 200)
+
+###############################
+# Close a streaming session   #
+###############################
+@app.route('/api/sessions/<session_id>', methods=['DELETE'])
+def close_session(session_id):
+    if not sessions.close(session_id):
+        data = {'message': 'Unknown or expired session', 'code': 'FAILED'}
+        return make_response(jsonify(data), 404)
+    data = {'message': 'Session closed', 'code': 'SUCCESS'}
     return make_response(jsonify(data), 200)
-    
+
 if __name__ == '__main__':
+    if background_warm_up:
+        threading.Thread(target=start_warm_up, daemon=True).start()
+    else:
+        warm_up()
+    start_hot_reload()
+    app.logger.info('Listening on port ' + str(server_port) + ' ' + str(round(time.time() - launch_time, 2)) + ' s after launch')
     app.run(host='0.0.0.0', port=server_port)
@@ -0,0 +1,127 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+MIN_RETIRE_SHARDS = 64
+
+#####################################################################
+# Latency histograms and counters in the Prometheus text format.     #
+# Each thread records into its own values, so recording only takes  #
+# a lock once per thread to register them (in constant amortized    #
+# time); the values of every thread are only added up when scraped  #
+#####################################################################
+class Metrics:
+    def __init__(self, buckets:tuple=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.shards = []
+        # Values of the threads that already finished (the server uses one thread per request)
+        self.retired = {}
+        # Finished threads are also retired when registering once the shards double, so they stay bounded without scrapes
+        self.retire_at = MIN_RETIRE_SHARDS
+        self.readers = []
+
+    def observe(self, stage:str, seconds:float):
+        values = self._values()
+        counts = values.get(('stage', stage))
+        if counts is None:
+            counts = values[('stage', stage)] = [0] * (len(self.buckets) + 2)
+        counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        counts[-1] += seconds
+
+    @contextmanager
+    def timed(self, stage:str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def count(self, status):
+        values = self._values()
+        key = ('status', str(status))
+        values[key] = values.get(key, 0) + 1
+
+    # function returns a list of (labels, value) read when the metrics are scraped
+    def gauge(self, name:str, description:str, function):
+        self.readers.append((name, 'gauge', description, function))
+
+    # Same as gauge for totals kept by other objects (they must only grow)
+    def counter(self, name:str, description:str, function):
+        self.readers.append((name, 'counter', description, function))
+
+    def render(self):
+        totals = self._collect()
+        lines = ['# HELP inference_stage_seconds Time spent in each inference stage',
+            '# TYPE inference_stage_seconds histogram']
+        for (kind, stage), counts in sorted(totals.items()):
+            if kind != 'stage':
+                continue
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative = cumulative + count
+                lines.append('inference_stage_seconds_bucket{stage="' + stage + '",le="' + str(bound) + '"} ' + str(cumulative))
+            lines.append('inference_stage_seconds_sum{stage="' + stage + '"} ' + repr(float(counts[-1])))
+            lines.append('inference_stage_seconds_count{stage="' + stage + '"} ' + str(cumulative))
+        lines.append('# HELP inference_requests_total Requests by response status code')
+        lines.append('# TYPE inference_requests_total counter')
+        for (kind, status), count in sorted(totals.items()):
+            if kind == 'status':
+                lines.append('inference_requests_total{status="' + status + '"} ' + str(count))
+        for name, kind, description, function in self.readers:
+            lines.append('# HELP ' + name + ' ' + description)
+            lines.append('# TYPE ' + name + ' ' + kind)
+            for labels, value in function():
+                label_text = ','.join(key + '="' + str(label) + '"' for key, label in labels.items())
+                lines.append(name + ('{' + label_text + '}' if label_text else '') + ' ' + str(value))
+        return '\n'.join(lines) + '\n'
+
+    def _values(self):
+        values = getattr(self.local, 'values', None)
+        if values is None:
+            values = self.local.values = {}
+            with self.lock:
+                if len(self.shards) >= self.retire_at:
+                    self._retire()
+                self.shards.append((threading.current_thread(), values))
+        return values
+
+    # Must be called holding self.lock. Finished threads no longer write their values
+    def _retire(self):
+        alive = []
+        for thread, values in self.shards:
+            if thread.is_alive():
+                alive.append((thread, values))
+            else:
+                _merge(self.retired, values)
+        self.shards = alive
+        self.retire_at = max(MIN_RETIRE_SHARDS, 2 * len(alive))
+
+    def _collect(self):
+        with self.lock:
+            self._retire()
+            totals = _merge({}, self.retired)
+            for _, values in self.shards:
+                _merge(totals, values)
+        return totals
+
+def _merge(totals:dict, values:dict):
+    for key, value in list(values.items()):
+        if isinstance(value, list):
+            current = totals.setdefault(key, [0] * len(value))
+            for i, item in enumerate(value):
+                current[i] += item
+        else:
+            totals[key] = totals.get(key, 0) + value
+    return totals
+
+# Metrics of this process
+collector = Metrics()
+observe = collector.observe
+timed = collector.timed
+count = collector.count
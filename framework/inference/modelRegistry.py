@@ -0,0 +1,213 @@
+import os
+import gc
+import threading
+import time
+from collections import OrderedDict
+import nnUtils as nn
+import metrics
+from batcher import MicroBatcher
+
+#################################################
+# Neural network already built and kept in RAM  #
+#################################################
+class ResidentModel:
+    def __init__(self, name:str, model, info:dict, batching_cfg:dict, concurrency_cfg:dict, version:tuple=None):
+        self.name = name
+        # Signature of the files the network was built from (see ModelRegistry.version)
+        self.version = version
+        # Keras neural networks predict through the compiled batch size buckets
+        if batching_cfg["bucketed"] and not isinstance(model, nn.TFLiteModel):
+            model = nn.BucketedModel(model, batching_cfg["max-batch-size"])
+        self.model = model
+        # Preprocessing parameters (window shape, FFT, movements) or None if the network has no metadata
+        self.info = info
+        self.nbytes = nn.model_memory_size(model)
+        self.loaded_at = time.time()
+        self.batcher = MicroBatcher(model, batching_cfg["max-batch-size"], batching_cfg["max-wait-ms"])
+        # Requests of this network being served at the same time, so a slow network cannot take every server thread
+        self.slots = threading.BoundedSemaphore(int(concurrency_cfg["max-requests"]))
+        self.slot_wait = float(concurrency_cfg["max-wait-ms"]) / 1000.0
+        # Requests holding this version (see ModelRegistry.checkout)
+        self.users = 0
+
+    # False if no slot got free in time
+    def acquire(self):
+        return self.slots.acquire(timeout=self.slot_wait)
+
+    def release(self):
+        self.slots.release()
+
+###########################################################
+# Registry that keeps the loaded neural networks in memory #
+# and evicts the least recently used ones over the budget. #
+# A network can be rebuilt and swapped in while requests   #
+# still holding the old version finish on it               #
+###########################################################
+class ModelRegistry:
+    def __init__(self, app, nn_path:str, memory_budget_mb:int, batching_cfg:dict, concurrency_cfg:dict, loader=nn.load_nueral_network):
+        self.app = app
+        self.nn_path = nn_path
+        self.loader = loader
+        self.memory_budget = int(memory_budget_mb) * 1024 * 1024
+        self.batching_cfg = batching_cfg
+        self.concurrency_cfg = concurrency_cfg
+        self.models = OrderedDict()
+        # Versions replaced or evicted while requests still held them
+        self.retiring = []
+        self.lock = threading.Lock()
+        self.loading_locks = {}
+
+    def get(self, name:str):
+        resident = self._touch(name)
+        if resident is not None:
+            return resident
+        # Only one thread loads a given network, the rest wait for it
+        with self.lock:
+            loading_lock = self.loading_locks.setdefault(name, threading.Lock())
+        with loading_lock:
+            resident = self._touch(name)
+            if resident is not None:
+                return resident
+            resident = self._build(name)
+            with self.lock:
+                self.models[name] = resident
+                freed = self._evict()
+            self.app.logger.info('Neural network ' + name + ' is resident (' + str(resident.nbytes // 1024) + ' KB)')
+        self._free(freed)
+        return resident
+
+    # Same as get for a request: the version returned is kept until checkin, even if it is replaced meanwhile
+    def checkout(self, name:str):
+        while True:
+            resident = self.get(name)
+            with self.lock:
+                # Evicted or replaced between get and here
+                if self.models.get(name) is resident:
+                    resident.users = resident.users + 1
+                    return resident
+
+    def checkin(self, resident):
+        freed = []
+        with self.lock:
+            resident.users = resident.users - 1
+            if resident.users == 0 and resident in self.retiring:
+                self.retiring.remove(resident)
+                freed.append(resident)
+        self._free(freed)
+
+    # Builds and warms up (warmer(resident)) a new version of the network and swaps it in for the new requests.
+    # The current version keeps serving until then, and is freed once its last request finishes
+    def reload(self, name:str, warmer=None):
+        with self.lock:
+            loading_lock = self.loading_locks.setdefault(name, threading.Lock())
+        with loading_lock:
+            resident = self._build(name)
+            if warmer is not None:
+                warmer(resident)
+            with self.lock:
+                previous = self.models.pop(name, None)
+                self.models[name] = resident
+                freed = self._retire(previous) if previous is not None else []
+                freed = freed + self._evict()
+            self.app.logger.info('Neural network ' + name + ' reloaded (' + str(resident.nbytes // 1024) + ' KB)')
+        self._free(freed)
+        return resident
+
+    # Signature (path, size and modification time of every file) of a network folder, None if it does not exist
+    def version(self, name:str):
+        folder = self.nn_path + '/' + name
+        if not os.path.isdir(folder):
+            return None
+        files = []
+        for root, _, names in os.walk(folder):
+            for file in names:
+                # Files written by the server itself when loading (lock files, model.tflite converted from model.json
+                # or extracted from the artifact, and their temporary files)
+                if file.endswith('.lock') or file.startswith('model.tflite') or file.startswith('model.artifact.tflite'):
+                    continue
+                stat = os.stat(root + '/' + file)
+                files.append((os.path.relpath(root + '/' + file, folder), stat.st_size, stat.st_mtime_ns))
+        return tuple(sorted(files))
+
+    # Reloads the resident networks whose files changed. A change is only picked up once the folder
+    # is the same in two polls in a row, so a network being copied is not loaded half written
+    def watch(self, poll_seconds:float, warmer=None):
+        seen = {}
+        while True:
+            time.sleep(poll_seconds)
+            for resident in self.residents():
+                version = self.version(resident.name)
+                if version is None or version == resident.version:
+                    seen.pop(resident.name, None)
+                    continue
+                if seen.get(resident.name) != version:
+                    seen[resident.name] = version
+                    continue
+                seen.pop(resident.name, None)
+                try:
+                    self.reload(resident.name, warmer)
+                except Exception:
+                    self.app.logger.exception('Neural network ' + resident.name + ' could not be reloaded, keeping the resident version')
+
+    # Neural networks stored in nn_path (the name must be one of its folders)
+    def exists(self, name:str):
+        return name in next(os.walk(self.nn_path))[1]
+
+    # Snapshot of the resident neural networks, least recently used first
+    def residents(self):
+        with self.lock:
+            return list(self.models.values())
+
+    # Old versions still finishing their requests
+    def retiring_residents(self):
+        with self.lock:
+            return list(self.retiring)
+
+    # Memory of the resident networks and of the old versions not freed yet
+    def resident_bytes(self):
+        with self.lock:
+            return sum(resident.nbytes for resident in list(self.models.values()) + self.retiring)
+
+    def _build(self, name:str):
+        version = self.version(name)
+        with metrics.timed('model_load'):
+            model = self.loader(self.app, name, self.nn_path)
+        info = getattr(model, 'info', None) or nn.load_network_info(name, self.nn_path)
+        return ResidentModel(name, model, info, self.batching_cfg.get(name, self.batching_cfg["default"]),
+            self.concurrency_cfg.get(name, self.concurrency_cfg["default"]), version)
+
+    def _touch(self, name:str):
+        with self.lock:
+            resident = self.models.get(name)
+            if resident is not None:
+                self.models.move_to_end(name)
+            return resident
+
+    # Must be called holding self.lock. The most recent model is never evicted.
+    # Returns the residents that can be freed right away
+    def _evict(self):
+        freed = []
+        total = sum(resident.nbytes for resident in self.models.values())
+        while total > self.memory_budget and len(self.models) > 1:
+            name, resident = self.models.popitem(last=False)
+            total = total - resident.nbytes
+            self.app.logger.info('Evicting neural network ' + name + ' from memory')
+            freed = freed + self._retire(resident)
+        return freed
+
+    # Must be called holding self.lock. A version in use waits in self.retiring for its last checkin
+    def _retire(self, resident):
+        if resident.users > 0:
+            self.retiring.append(resident)
+            return []
+        return [resident]
+
+    # Must be called without self.lock. Keras models hold reference cycles, so they are collected here
+    def _free(self, residents:list):
+        for resident in residents:
+            resident.batcher.close()
+            self.app.logger.info('Freed version ' + repr(resident.loaded_at) + ' of neural network ' + resident.name
+                + ' (' + str(resident.nbytes // 1024) + ' KB)')
+        if residents:
+            residents.clear()
+            gc.collect()
@@ -1,9 +1,28 @@
 import importlib
-import tensorflow as tf
+import io
+import os
+import json
+import zipfile
+import shutil
+import fcntl
+import threading
 import numpy as np
-from keras.models import model_from_json
+import metrics
 
 ERROR = "Error"
+SHAPE_MISMATCH = "ShapeMismatch"
+ARTIFACT_FORMAT_VERSION = 1
+BINARY_MIMETYPE = 'application/octet-stream'
+NPY_MIMETYPE = 'application/x-npy'
+CSV_MIMETYPE = 'text/csv'
+BINARY_DTYPES = {'float32': '<f4', 'float16': '<f2'}
+
+# TensorFlow and Keras take seconds to import, so they are only imported when the first neural network is loaded
+def tensorflow():
+    return importlib.import_module('tensorflow')
+
+def model_from_json(model_json:str):
+    return importlib.import_module('keras.models').model_from_json(model_json)
 
 def load_nueral_network(app, name:str, nn_path:str):
     bestWeightsPath = nn_path + '/' + name + '/best_weights'
@@ -19,12 +38,320 @@ def load_nueral_network(app, name:str, nn_path:str):
     # load weights into new model
     return model
 
+###################################################################
+# TensorFlow Lite neural network. The interpreter memory-maps the  #
+# model file, so its weights are shared by every serving process   #
+###################################################################
+class TFLiteModel:
+    def __init__(self, model_path:str=None, model_content:bytes=None):
+        self.nbytes = os.path.getsize(model_path) if model_path else len(model_content)
+        # Preprocessing parameters when the model comes from an artifact
+        self.info = None
+        tf = tensorflow()
+        options = {}
+        # The default delegates repack the weights into private memory of each process
+        if hasattr(tf.lite.experimental, 'OpResolverType'):
+            options['experimental_op_resolver_type'] = tf.lite.experimental.OpResolverType.BUILTIN_WITHOUT_DEFAULT_DELEGATES
+        self.interpreter = tf.lite.Interpreter(model_path=model_path, model_content=model_content, **options)
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self.input_shape = tuple(self.input['shape'][1:])
+        self.batch_size = None
+        self.lock = threading.Lock()
+
+    def predict(self, data, batch_size:int=None):
+        with self.lock:
+            if len(data) != self.batch_size:
+                self.interpreter.resize_tensor_input(self.input['index'], (len(data),) + self.input_shape)
+                self.interpreter.allocate_tensors()
+                self.batch_size = len(data)
+            self.interpreter.set_tensor(self.input['index'], np.asarray(data, dtype=self.input['dtype']))
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self.output['index']).copy()
+
+#####################################################################
+# Keras neural network compiled once per batch size bucket (1, 2,   #
+# 4, ... max). Inputs are zero padded to the next bucket and run    #
+# through its concrete function, without retracing and without the  #
+# per call overhead of model.predict                                #
+#####################################################################
+class BucketedModel:
+    def __init__(self, model, max_batch_size:int):
+        tf = tensorflow()
+        self.model = model
+        self.weights = model.weights
+        self.input_shape = model.input_shape
+        self.buckets = [1]
+        while self.buckets[-1] < max_batch_size:
+            self.buckets.append(self.buckets[-1] * 2)
+        forward = tf.function(lambda x: model(x, training=False))
+        self.functions = {bucket: forward.get_concrete_function(tf.TensorSpec((bucket,) + tuple(self.input_shape[1:]), tf.float32))
+            for bucket in self.buckets}
+
+    def predict(self, data, batch_size:int=None):
+        data = np.asarray(data, dtype=np.float32)
+        outputs = []
+        for start in range(0, len(data), self.buckets[-1]):
+            chunk = data[start:start + self.buckets[-1]]
+            bucket = next(bucket for bucket in self.buckets if bucket >= len(chunk))
+            if bucket > len(chunk):
+                chunk = np.concatenate((chunk, np.zeros((bucket - len(chunk),) + chunk.shape[1:], dtype=np.float32)))
+            outputs.append(self.functions[bucket](chunk).numpy()[:min(len(data) - start, bucket)])
+        return np.concatenate(outputs)
+
+def tflite_is_outdated(name:str, nn_path:str):
+    tflitePath = nn_path + '/' + name + '/model.tflite'
+    if not os.path.exists(tflitePath):
+        return True
+    sources = [nn_path + '/' + name + '/model.json', nn_path + '/' + name + '/best_weights.index']
+    return any(os.path.getmtime(source) > os.path.getmtime(tflitePath) for source in sources if os.path.exists(source))
+
+# Converts the neural network to model.tflite when needed (only one process converts it)
+def load_tflite_network(app, name:str, nn_path:str):
+    tflitePath = nn_path + '/' + name + '/model.tflite'
+    with open(tflitePath + '.lock', 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        if tflite_is_outdated(name, nn_path):
+            model = load_nueral_network(app, name, nn_path)
+            app.logger.info('Converting neural network ' + name + ' to TensorFlow Lite')
+            converter = tensorflow().lite.TFLiteConverter.from_keras_model(model)
+            with open(tflitePath + '.tmp', 'wb') as tflite_file:
+                tflite_file.write(converter.convert())
+            os.replace(tflitePath + '.tmp', tflitePath)
+    app.logger.info('Loading TensorFlow Lite neural network with name: ' + name)
+    return TFLiteModel(tflitePath)
+
+def ensemble_path(name:str, nn_path:str):
+    return nn_path + '/' + name + '/ensemble.json'
+
+# Fold models of a k-fold training (subfolders of the neural network folder, one per fold) built as a
+# single Keras graph: one input shared by every fold and their softmax outputs averaged or voted
+def load_ensemble_network(app, name:str, nn_path:str):
+    folder = nn_path + '/' + name
+    with open(ensemble_path(name, nn_path)) as f:
+        ensemble = json.load(f)
+    folds = ensemble.get("folds") or sorted(fold for fold in next(os.walk(folder))[1] if os.path.exists(folder + '/' + fold + '/model.json'))
+    app.logger.info('Building ensemble ' + name + ' with ' + str(len(folds)) + ' folds (' + ensemble["combine"] + ')')
+    models = [load_nueral_network(app, fold, folder) for fold in folds]
+    keras = importlib.import_module('keras')
+    tf = tensorflow()
+    inputs = keras.Input(shape=models[0].input_shape[1:])
+    outputs = []
+    for i, model in enumerate(models):
+        # Every fold has the same layer names, they must be unique inside the ensemble graph
+        model._name = 'fold_' + str(i)
+        outputs.append(model(inputs, training=False))
+    if ensemble["combine"] == "vote":
+        # Share of the folds voting for each movement
+        combined = keras.layers.Lambda(lambda folds_outputs: tf.reduce_mean(
+            tf.one_hot(tf.argmax(tf.stack(folds_outputs), axis=-1), folds_outputs[0].shape[-1]), axis=0))(outputs)
+    else:
+        combined = keras.layers.Average()(outputs)
+    return keras.Model(inputs, combined, name=name)
+
+def info_path(name:str, nn_path:str):
+    return nn_path + '/' + name + '/info.json'
+
+# Preprocessing parameters of a neural network stored next to it (same fields as info in config.json)
+def load_network_info(name:str, nn_path:str):
+    if not os.path.exists(info_path(name, nn_path)):
+        return None
+    with open(info_path(name, nn_path)) as f:
+        return json.load(f)
+
+def quantized_path(name:str, nn_path:str, variant:str):
+    return nn_path + '/' + name + '/model-' + variant + '.tflite'
+
+# Quantized TensorFlow Lite neural network written by framework/train/quantize.py (dynamic or int8)
+def load_quantized_network(app, name:str, nn_path:str, variant:str):
+    app.logger.info('Loading ' + variant + ' TensorFlow Lite neural network with name: ' + name)
+    return TFLiteModel(quantized_path(name, nn_path, variant))
+
+def artifact_path(name:str, nn_path:str):
+    return nn_path + '/' + name + '/model.artifact'
+
+# model.tflite of the artifact, extracted next to it
+def artifact_tflite_path(name:str, nn_path:str):
+    return artifact_path(name, nn_path) + '.tflite'
+
+# Extracts model.tflite from the artifact when needed (only one process extracts it), so the interpreter
+# maps the file and prefork workers share its read-only weights instead of each holding a copy
+def extract_artifact_tflite(artifact, name:str, nn_path:str):
+    tflitePath = artifact_tflite_path(name, nn_path)
+    with open(tflitePath + '.lock', 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        if not os.path.exists(tflitePath) or os.path.getmtime(tflitePath) < os.path.getmtime(artifact_path(name, nn_path)) \
+                or os.path.getsize(tflitePath) != artifact.getinfo('model.tflite').file_size:
+            with artifact.open('model.tflite') as source, open(tflitePath + '.tmp', 'wb') as tflite_file:
+                shutil.copyfileobj(source, tflite_file)
+            os.replace(tflitePath + '.tmp', tflitePath)
+    return tflitePath
+
+# Single file neural network written by exportArtifact.py: TensorFlow Lite graph with a fixed
+# input signature, preprocessing parameters, movements list and a warm-up sample
+def load_artifact_network(app, name:str, nn_path:str):
+    app.logger.info('Loading neural network artifact with name: ' + name)
+    with zipfile.ZipFile(artifact_path(name, nn_path)) as artifact:
+        manifest = json.loads(artifact.read('manifest.json'))
+        if manifest["format-version"] > ARTIFACT_FORMAT_VERSION:
+            raise ValueError('Unsupported artifact format version ' + str(manifest["format-version"]))
+        try:
+            model = TFLiteModel(extract_artifact_tflite(artifact, name, nn_path))
+        except OSError as e:
+            # Read-only neural networks folder: the graph is loaded into the memory of this process
+            app.logger.warning('model.tflite of ' + name + ' could not be extracted (' + str(e) + '), loading it from the artifact')
+            model = TFLiteModel(model_content=artifact.read('model.tflite'))
+        warmup_sample = np.load(io.BytesIO(artifact.read('warmup.npy')))
+    model.info = manifest["info"]
+    prediction = model.predict(process_input_data(model.info, warmup_sample, app))
+    if not np.allclose(prediction, manifest["warmup-prediction"], atol=1e-4):
+        app.logger.warning('Warm-up prediction of ' + name + ' differs from the one recorded at export time')
+    return model
+
+def model_memory_size(model):
+    if isinstance(model, TFLiteModel):
+        return model.nbytes
+    nbytes = 0
+    for weight in model.weights:
+        nbytes = nbytes + int(np.prod(weight.shape)) * weight.dtype.size
+    return nbytes
+
+# Shape of a binary window for the neural network of cfg_data: rows x columns, or rows x columns*3 if the FFT
+# is already included (any number of rows without fixed_rows). Returns ERROR if it is not a valid 2D shape,
+# SHAPE_MISMATCH if it is not the one of the neural network and None otherwise
+def check_tensor_shape(app, shape:tuple, cfg_data, fixed_rows:bool=True):
+    if len(shape) != 2 or any(dim <= 0 for dim in shape):
+        app.logger.info('Invalid tensor shape: ' + str(shape))
+        return ERROR
+    columns = int(cfg_data["columns"])
+    if (fixed_rows and shape[0] != int(cfg_data["rows"])) or shape[1] not in (columns, columns * 3):
+        app.logger.info('Tensor shape ' + str(shape) + ' does not match the neural network (' + str(cfg_data["rows"]) + ', ' + str(columns) + ')')
+        return SHAPE_MISMATCH
+    return None
+
+# Raw little-endian tensor. The array is a read-only view over the request body (no copy)
+def parse_binary_tensor(app, body:bytes, dtype:str, shape:str, cfg_data, fixed_rows:bool=True):
+    if dtype not in BINARY_DTYPES:
+        app.logger.info('Unsupported tensor dtype: ' + str(dtype))
+        return ERROR
+    try:
+        shape = tuple(int(dim) for dim in shape.split(','))
+    except (AttributeError, ValueError):
+        app.logger.info('Invalid tensor shape: ' + str(shape))
+        return ERROR
+    error = check_tensor_shape(app, shape, cfg_data, fixed_rows)
+    if error is not None:
+        return error
+    dtype = np.dtype(BINARY_DTYPES[dtype])
+    if int(np.prod(shape)) * dtype.itemsize != len(body):
+        app.logger.info('Tensor shape ' + str(shape) + ' does not match a body of ' + str(len(body)) + ' bytes')
+        return ERROR
+    return np.frombuffer(body, dtype=dtype).reshape(shape)
+
+# .npy file. The header is parsed and the data is a read-only view over the request body (no copy)
+def parse_npy_tensor(app, body:bytes, cfg_data, fixed_rows:bool=True):
+    stream = io.BytesIO(body)
+    try:
+        version = np.lib.format.read_magic(stream)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(stream)
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(stream)
+    except ValueError as e:
+        app.logger.info('Invalid npy header: ' + str(e))
+        return ERROR
+    if dtype.kind != 'f':
+        app.logger.info('Unsupported npy tensor: ' + str(dtype) + ' ' + str(shape))
+        return ERROR
+    error = check_tensor_shape(app, shape, cfg_data, fixed_rows)
+    if error is not None:
+        return error
+    count = int(np.prod(shape))
+    if stream.tell() + count * dtype.itemsize != len(body):
+        app.logger.info('npy tensor ' + str(shape) + ' does not match a body of ' + str(len(body)) + ' bytes')
+        return ERROR
+    data = np.frombuffer(body, dtype=dtype, count=count, offset=stream.tell())
+    if fortran_order:
+        return data.reshape(shape[::-1]).T
+    return data.reshape(shape)
+
+# Column names of a CSV window: one column per quaternion component of each sensor
+def expected_csv_header(cfg_data):
+    components = int(cfg_data["columns"]) // len(cfg_data["sensorslist"])
+    return [sensor + '-' + str(i) for sensor in cfg_data["sensorslist"] for i in range(components)]
+
+# Whole CSV window parsed in one pass into a preallocated float32 array.
+# Header and shape are validated before any number is parsed. Without fixed_rows
+# any number of rows is accepted (streamed frames).
+def parse_csv_window(app, body:bytes, cfg_data, fixed_rows:bool=True):
+    header, _, payload = body.replace(b'\r', b'').strip().partition(b'\n')
+    header = header.decode('utf-8', 'replace').split(',')
+    expected_header = expected_csv_header(cfg_data)
+    if header != expected_header and header != expected_header * 3:
+        app.logger.info('CSV header does not match the configured sensors')
+        return ERROR
+    columns = len(header)
+    raw = np.frombuffer(payload, dtype=np.uint8)
+    newlines = np.flatnonzero(raw == ord('\n'))
+    rows = int(cfg_data["rows"]) if fixed_rows else len(newlines) + 1
+    if len(newlines) + 1 != rows or not payload:
+        app.logger.info('CSV window has ' + str(len(newlines) + 1) + ' rows, expected ' + str(rows))
+        return ERROR
+    commas = np.flatnonzero(raw == ord(','))
+    commas_per_row = np.bincount(np.searchsorted(newlines, commas), minlength=rows)
+    if (commas_per_row != columns - 1).any():
+        app.logger.info('CSV window rows must have ' + str(columns) + ' columns')
+        return ERROR
+    data = np.empty((rows, columns), dtype=np.float32)
+    try:
+        data.reshape(-1)[:] = payload.replace(b'\n', b',').split(b',')
+    except ValueError:
+        app.logger.info('CSV window contains non numeric values')
+        return ERROR
+    return data
+
 def calculate_FFT(data):
-  data = data.astype(np.float32)
-  fft_data = np.fft.fft2(data).round(7)
-  fft_df_real = fft_data.real.astype(np.float32)
-  fft_df_imag = fft_data.imag.astype(np.float32)
-  return np.concatenate((data, fft_df_real, fft_df_imag), axis=1)
+  with metrics.timed('fft'):
+    data = data.astype(np.float32)
+    fft_data = np.fft.fft2(data).round(7)
+    fft_df_real = fft_data.real.astype(np.float32)
+    fft_df_imag = fft_data.imag.astype(np.float32)
+    return np.concatenate((data, fft_df_real, fft_df_imag), axis=1)
+
+# Zero-copy view with every window of rows rows (one every hop rows) of a recording
+def sliding_windows(recording:np.ndarray, rows:int, hop:int):
+    recording = np.ascontiguousarray(recording)
+    total = (len(recording) - rows) // hop + 1
+    if total <= 0:
+        return recording[:0].reshape(0, rows, recording.shape[1])
+    row_stride, column_stride = recording.strides
+    return np.lib.stride_tricks.as_strided(recording, shape=(total, rows, recording.shape[1]),
+        strides=(hop * row_stride, row_stride, column_stride), writeable=False)
+
+# calculate_FFT of several windows (windows x rows x columns) in one vectorized call
+def calculate_FFT_batch(windows):
+    with metrics.timed('fft'):
+        windows = windows.astype(np.float32)
+        fft_data = np.fft.fft2(windows, axes=(1, 2)).round(7)
+        fft_df_real = fft_data.real.astype(np.float32)
+        fft_df_imag = fft_data.imag.astype(np.float32)
+        return np.concatenate((windows, fft_df_real, fft_df_imag), axis=2)
+
+# process_input_data of several raw windows (windows x rows x columns) at once
+def process_input_batch(cfg_data, windows):
+    if cfg_data["FFT"]:
+        windows = calculate_FFT_batch(windows)
+    return windows.reshape(len(windows), windows.shape[1], windows.shape[2], 1)
+
+# Most frequent class in the neighbourhood (window rows) of every prediction
+def majority_vote(indices:np.ndarray, classes:int, window:int):
+    one_hot = np.zeros((len(indices) + 1, classes), dtype=np.int32)
+    one_hot[np.arange(1, len(indices) + 1), indices] = 1
+    counts = np.cumsum(one_hot, axis=0)
+    positions = np.arange(len(indices))
+    start = np.clip(positions - window // 2, 0, len(indices))
+    end = np.clip(positions + window // 2 + 1, 0, len(indices))
+    return np.argmax(counts[end] - counts[start], axis=1)
 
 def process_input_data(cfg_data, data, app):
     if cfg_data["FFT"]:
@@ -0,0 +1,70 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+import numpy as np
+
+# Content hash of a decoded window (as float32) for one neural network
+def window_key(model_id:str, window:np.ndarray, *extra):
+    window = np.ascontiguousarray(window, dtype=np.float32)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update((model_id + '|' + ','.join(str(size) for size in window.shape) + '|' + ','.join(str(item) for item in extra)).encode())
+    digest.update(window.data)
+    return digest.digest()
+
+#####################################################################
+# Predictions of recently seen windows, with LRU eviction and TTL.  #
+# Identical requests running at the same time share one prediction #
+#####################################################################
+class PredictionCache:
+    def __init__(self, max_entries:int, ttl_seconds:float):
+        self.max_entries = int(max_entries)
+        self.ttl = float(ttl_seconds)
+        self.entries = OrderedDict()
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    # compute returns (value, error). Only values without error are stored and shared with
+    # the coalesced requests, which compute their own result otherwise
+    def get_or_compute(self, key:bytes, compute):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits = self.hits + 1
+                return entry[1], None
+            if entry is not None:
+                del self.entries[key]
+            future = self.pending.get(key)
+            owner = future is None
+            if owner:
+                future = self.pending[key] = Future()
+                self.misses = self.misses + 1
+            else:
+                self.coalesced = self.coalesced + 1
+        if not owner:
+            value = future.result()
+            return compute() if value is None else (value, None)
+        try:
+            value, error = compute()
+        except Exception as e:
+            with self.lock:
+                del self.pending[key]
+            future.set_exception(e)
+            raise
+        with self.lock:
+            del self.pending[key]
+            if error is None:
+                self.entries[key] = (time.monotonic() + self.ttl, value)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+        future.set_result(value if error is None else None)
+        return value, error
+
+    def size(self):
+        with self.lock:
+            return len(self.entries)
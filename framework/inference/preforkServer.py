@@ -0,0 +1,111 @@
+# preforkServer.py - serves the inference API from several worker processes
+import os, sys, json, socket, signal, select, time, logging
+
+# main_path = os.getcwd() + '/TFG'
+main_path = '/TFG'
+config_path = main_path + '/framework/inference/config.json'
+
+# Environment variables
+log_level = os.environ.get('LOG_LEVEL') or logging.INFO
+server_port = int(os.environ.get('SERVER_PORT') or 8082)
+server_env = os.environ.get('ENV') or "LOCAL"
+with open(config_path) as f:
+    serving_cfg = json.load(f)[server_env]["serving"]
+workers_number = int(os.environ.get('WORKERS') or serving_cfg["workers"])
+# Workers share the weights through the memory-mapped TensorFlow Lite model
+os.environ['SERVING_BACKEND'] = os.environ.get('SERVING_BACKEND') or serving_cfg["backend"]
+
+logging.basicConfig(level=log_level, format='[%(asctime)s] %(levelname)s in preforkServer: %(message)s')
+logger = logging.getLogger('preforkServer')
+stopping = False
+
+#####################################################################
+# The master never imports TensorFlow: it is not fork safe, so each #
+# worker imports the server (and TensorFlow) after being forked     #
+#####################################################################
+def fork(target, *args):
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        code = 1
+        try:
+            target(*args)
+            code = 0
+        except Exception:
+            logger.exception('Worker ' + str(os.getpid()) + ' failed')
+        finally:
+            os._exit(code)
+    return pid
+
+# Builds (and converts if needed) the default neural network once before forking the workers
+def prepare_default_model():
+    import inferenceServer as server
+    server.warm_up()
+
+# A worker only starts accepting connections once its neural network is warm
+def run_worker(listen_socket, ready_pipe:int):
+    from werkzeug.serving import make_server
+    import inferenceServer as server
+    server.warm_up()
+    server.start_hot_reload()
+    os.write(ready_pipe, (str(os.getpid()) + '\n').encode())
+    httpd = make_server('0.0.0.0', server_port, server.app, threaded=True, fd=listen_socket.fileno())
+    httpd.serve_forever()
+
+def stop(signum, frame):
+    global stopping
+    stopping = True
+
+##########
+#  Main  #
+##########
+if __name__ == '__main__':
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    start = time.time()
+    _, status = os.waitpid(fork(prepare_default_model), 0)
+    if status != 0:
+        logger.error('Default neural network could not be prepared')
+        sys.exit(1)
+    logger.info('Default neural network prepared in ' + str(round(time.time() - start, 2)) + ' s')
+
+    listen_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listen_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listen_socket.bind(('0.0.0.0', server_port))
+    listen_socket.listen(128)
+    listen_socket.set_inheritable(True)
+    ready_read, ready_write = os.pipe()
+
+    workers = set(fork(run_worker, listen_socket, ready_write) for _ in range(workers_number))
+    ready_workers = set()
+    logger.info('Launched ' + str(workers_number) + ' workers on port ' + str(server_port))
+    while not stopping:
+        try:
+            readable, _, _ = select.select([ready_read], [], [], 1.0)
+        except InterruptedError:
+            continue
+        if readable:
+            for pid in os.read(ready_read, 4096).decode().split():
+                ready_workers.add(int(pid))
+                logger.info('Worker ' + pid + ' ready (' + str(len(ready_workers)) + '/' + str(workers_number) + ')')
+        # Replace the workers that died
+        pid, status = os.waitpid(-1, os.WNOHANG)
+        while pid and not stopping:
+            logger.warning('Worker ' + str(pid) + ' exited with status ' + str(status) + ', launching a new one')
+            workers.discard(pid)
+            ready_workers.discard(pid)
+            workers.add(fork(run_worker, listen_socket, ready_write))
+            pid, status = os.waitpid(-1, os.WNOHANG)
+
+    logger.info('Stopping workers')
+    for pid in workers:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    for pid in workers:
+        try:
+            os.waitpid(pid, 0)
+        except ChildProcessError:
+            pass
@@ -0,0 +1,109 @@
+import threading
+import time
+import uuid
+import numpy as np
+from slidingFFT import SlidingFFT
+
+###############################################################
+# Streaming session: keeps the last window in a ring buffer   #
+# and hands out a full window every hop new rows              #
+###############################################################
+class StreamingSession:
+    def __init__(self, session_id:str, model:str, rows:int, columns:int, hop:int, fft_recompute_rows:int=None):
+        self.id = session_id
+        # Neural network that predicts the windows of this session
+        self.model = model
+        self.rows = rows
+        self.hop = hop
+        # With the FFT enabled the window features are kept up to date incrementally
+        self.fft = SlidingFFT(rows, columns, fft_recompute_rows) if fft_recompute_rows else None
+        self.buffer = np.zeros((rows, columns), dtype=np.float32) if self.fft is None else None
+        self.position = 0
+        self.filled = 0
+        # Rows still needed before the next window is ready
+        self.until_next = rows
+        self.last_seen = time.monotonic()
+        self.lock = threading.Lock()
+
+    # Returns the windows completed by these frames, oldest first
+    def push(self, frames:np.ndarray):
+        windows = []
+        with self.lock:
+            self.last_seen = time.monotonic()
+            start = 0
+            while start < len(frames):
+                chunk = frames[start:start + self.until_next]
+                self._write(chunk)
+                start = start + len(chunk)
+                self.until_next = self.until_next - len(chunk)
+                if self.until_next == 0:
+                    windows.append(self.window())
+                    self.until_next = self.hop
+        return windows
+
+    # Copy of the buffered window in chronological order (with its FFT if enabled)
+    def window(self):
+        if self.fft is not None:
+            return self.fft.features()
+        return np.concatenate((self.buffer[self.position:], self.buffer[:self.position]))
+
+    def _write(self, chunk:np.ndarray):
+        if self.fft is not None:
+            self.fft.push(chunk)
+            self.filled = self.fft.filled
+            return
+        if len(chunk) >= self.rows:
+            self.buffer[:] = chunk[-self.rows:]
+            self.position = 0
+        else:
+            end = self.position + len(chunk)
+            if end <= self.rows:
+                self.buffer[self.position:end] = chunk
+            else:
+                first = self.rows - self.position
+                self.buffer[self.position:] = chunk[:first]
+                self.buffer[:end - self.rows] = chunk[first:]
+            self.position = end % self.rows
+        self.filled = min(self.rows, self.filled + len(chunk))
+
+#################################################################
+# Open streaming sessions, capped in number and expired on idle #
+#################################################################
+class SessionManager:
+    def __init__(self, sessions_cfg:dict):
+        self.fft_recompute_rows = int(sessions_cfg["fft-recompute-rows"])
+        self.default_hop = int(sessions_cfg["hop-rows"])
+        self.max_sessions = int(sessions_cfg["max-sessions"])
+        self.idle_timeout = float(sessions_cfg["idle-timeout-seconds"])
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    # Session for the window shape in info. Returns None when the session cap has been reached
+    def open(self, model:str, info:dict, hop:int=None):
+        with self.lock:
+            self._expire()
+            if len(self.sessions) >= self.max_sessions:
+                return None
+            session = StreamingSession(uuid.uuid4().hex, model, int(info["rows"]), int(info["columns"]), hop or self.default_hop,
+                self.fft_recompute_rows if info["FFT"] else None)
+            self.sessions[session.id] = session
+            return session
+
+    def get(self, session_id:str):
+        with self.lock:
+            self._expire()
+            return self.sessions.get(session_id)
+
+    def close(self, session_id:str):
+        with self.lock:
+            return self.sessions.pop(session_id, None) is not None
+
+    def count(self):
+        with self.lock:
+            return len(self.sessions)
+
+    # Must be called holding self.lock
+    def _expire(self):
+        now = time.monotonic()
+        for session_id in [key for key, session in self.sessions.items() if now - session.last_seen > self.idle_timeout]:
+            del self.sessions[session_id]
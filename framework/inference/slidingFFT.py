@@ -0,0 +1,70 @@
+import functools
+import numpy as np
+
+# Maximum difference against nnUtils.calculate_FFT, relative to the largest magnitude
+# of the window features. The spectrum itself is kept in complex128 and only the
+# float32 output is rounded (checked by test/benchmarkSlidingFFT.py)
+TOLERANCE = 1e-6
+
+# twiddles[k, j] = exp(-2*pi*i*k*j/rows), shared by every window with the same rows
+@functools.lru_cache(maxsize=8)
+def _twiddles(rows:int):
+    k = np.arange(rows)
+    return np.exp(-2j * np.pi * (np.outer(k, k) % rows) / rows)
+
+#####################################################################
+# 2D-FFT of a sliding window updated as rows enter and leave.       #
+# The FFT of every row along the sensor axis is cached and the      #
+# time axis is updated with the sliding DFT recurrence:             #
+#   X'[k] = exp(2*pi*i*k*h/rows) * (X[k] + sum_j (new_j - old_j) * exp(-2*pi*i*k*j/rows))  #
+# A full recompute every recompute_every rows bounds the drift.    #
+# Hops longer than max_incremental_hop recompute the time axis      #
+# directly from the cached row transforms, which is cheaper there.  #
+#####################################################################
+class SlidingFFT:
+    def __init__(self, rows:int, columns:int, recompute_every:int):
+        self.rows = rows
+        self.columns = columns
+        self.recompute_every = max(1, int(recompute_every))
+        self.max_incremental_hop = 2 * int(np.log2(rows))
+        self.data = np.zeros((rows, columns), dtype=np.float32)
+        self.row_fft = np.zeros((rows, columns), dtype=np.complex128)
+        self.spectrum = None
+        self.position = 0
+        self.filled = 0
+        self.updated_rows = 0
+
+    def push(self, frames:np.ndarray):
+        frames = np.asarray(frames, dtype=np.float32)
+        if len(frames) >= self.rows:
+            frames = frames[-self.rows:]
+            self.position = 0
+        hop = len(frames)
+        indices = (self.position + np.arange(hop)) % self.rows
+        frames_fft = np.fft.fft(frames.astype(np.float64), axis=1)
+        incremental = self.spectrum is not None and hop <= self.max_incremental_hop
+        if incremental:
+            twiddles = _twiddles(self.rows)
+            self.spectrum = self.spectrum + twiddles[:, :hop] @ (frames_fft - self.row_fft[indices])
+            self.spectrum = self.spectrum * twiddles[:, (self.rows - hop) % self.rows, np.newaxis]
+            self.updated_rows = self.updated_rows + hop
+        self.data[indices] = frames
+        self.row_fft[indices] = frames_fft
+        self.position = (self.position + hop) % self.rows
+        self.filled = min(self.rows, self.filled + hop)
+        if self.filled == self.rows and (not incremental or self.updated_rows >= self.recompute_every):
+            self._recompute()
+
+    # Window in chronological order
+    def window(self):
+        return np.concatenate((self.data[self.position:], self.data[:self.position]))
+
+    # Same output as nnUtils.calculate_FFT(self.window())
+    def features(self):
+        return np.concatenate((self.window(), self.spectrum.real.round(7).astype(np.float32), self.spectrum.imag.round(7).astype(np.float32)), axis=1)
+
+    # Time axis FFT over the cached row transforms
+    def _recompute(self):
+        row_fft = np.concatenate((self.row_fft[self.position:], self.row_fft[:self.position]))
+        self.spectrum = np.fft.fft(row_fft, axis=0)
+        self.updated_rows = 0
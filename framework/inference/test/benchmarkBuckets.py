@@ -0,0 +1,46 @@
+import sys, time, argparse
+import numpy as np
+from flask import Flask
+
+# main_path = os.getcwd() + '/TFG'
+main_path = '/TFG'
+sys.path.append(main_path + '/framework/inference')
+import nnUtils as nn
+
+nn_path = main_path + '/framework/inference/neuralNetworks'
+batch_sizes = [1, 3, 8, 13, 32]
+repetitions = 200
+
+# Median and 99th percentile (ms) of predict
+def time_predict(predict, batch:np.ndarray):
+    for _ in range(5):
+        predict(batch)
+    timings = []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        predict(batch)
+        timings.append(time.perf_counter() - start)
+    return np.percentile(timings, 50) * 1000, np.percentile(timings, 99) * 1000
+
+##########
+#  Main  #
+##########
+parser = argparse.ArgumentParser(description='Compare model.predict against the batch size buckets of BucketedModel')
+parser.add_argument('name', help='Neural network in framework/inference/neuralNetworks')
+parser.add_argument('--max-batch-size', type=int, default=32, help='Largest bucket (batching max-batch-size)')
+args = parser.parse_args()
+
+app = Flask(__name__)
+model = nn.load_nueral_network(app, args.name, nn_path)
+start = time.perf_counter()
+bucketed = nn.BucketedModel(model, args.max_batch_size)
+print('Buckets ' + str(bucketed.buckets) + ' compiled in {:.2f} s'.format(time.perf_counter() - start))
+input_shape = tuple(model.input_shape[1:])
+
+print('{:>6} {:>18} {:>18} {:>18} {:>18} {:>12}'.format('batch', 'predict p50 (ms)', 'predict p99 (ms)', 'buckets p50 (ms)', 'buckets p99 (ms)', 'max diff'))
+for batch_size in batch_sizes:
+    batch = np.random.rand(batch_size, *input_shape).astype(np.float32)
+    predict = time_predict(lambda x: model.predict(x, batch_size=len(x), verbose=0), batch)
+    buckets = time_predict(bucketed.predict, batch)
+    difference = np.abs(bucketed.predict(batch) - model.predict(batch, batch_size=batch_size, verbose=0)).max()
+    print('{:>6} {:>18.3f} {:>18.3f} {:>18.3f} {:>18.3f} {:>12.2e}'.format(batch_size, predict[0], predict[1], buckets[0], buckets[1], difference))
@@ -0,0 +1,53 @@
+import os, sys, json, time, io, csv, codecs
+import numpy as np
+from flask import Flask
+
+# main_path = os.getcwd() + '/TFG'
+main_path = '/TFG'
+sys.path.append(main_path + '/framework/inference')
+import nnUtils as nn
+
+examples_path = main_path + '/framework/inference/neuralNetworks/N5-250-28-9-1/examples/'
+config_path = main_path + '/framework/inference/config.json'
+repetitions = 500
+
+# Previous parser of inferenceServer.inference
+def csv_reader_loop(body:bytes):
+    data = []
+    stream = codecs.iterdecode(io.BytesIO(body), 'utf-8')
+    for row in csv.reader(stream, dialect=csv.excel):
+        if row:
+            data.append(row)
+    del data[0]
+    data = np.array(data)
+    return data.astype(np.float64)
+
+def time_parser(parser, body:bytes):
+    timings = []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        parser(body)
+        timings.append(time.perf_counter() - start)
+    return np.median(timings) * 1000, np.percentile(timings, 99) * 1000
+
+##########
+#  Main  #
+##########
+app = Flask(__name__)
+with open(config_path) as f:
+    cfg_data = json.load(f)["LOCAL"]["info"]
+
+print('{:<45} {:>14} {:>14} {:>14} {:>14} {:>8}'.format('Example', 'loop p50 (ms)', 'loop p99 (ms)', 'vect p50 (ms)', 'vect p99 (ms)', 'speedup'))
+for example in sorted(os.listdir(examples_path)):
+    with open(examples_path + example, 'rb') as f:
+        body = f.read()
+    vectorized = nn.parse_csv_window(app, body, cfg_data)
+    if str(vectorized) == nn.ERROR:
+        print('{:<45} rejected by the vectorized parser'.format(example))
+        continue
+    if not np.allclose(vectorized, csv_reader_loop(body)):
+        print('{:<45} parsers disagree'.format(example))
+        continue
+    loop_p50, loop_p99 = time_parser(csv_reader_loop, body)
+    vectorized_p50, vectorized_p99 = time_parser(lambda body: nn.parse_csv_window(app, body, cfg_data), body)
+    print('{:<45} {:>14.3f} {:>14.3f} {:>14.3f} {:>14.3f} {:>7.1f}x'.format(example, loop_p50, loop_p99, vectorized_p50, vectorized_p99, loop_p50 / vectorized_p50))
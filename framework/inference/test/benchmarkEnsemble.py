@@ -0,0 +1,52 @@
+import os, sys, json, time, argparse
+import numpy as np
+from flask import Flask
+
+# main_path = os.getcwd() + '/TFG'
+main_path = '/TFG'
+sys.path.append(main_path + '/framework/inference')
+import nnUtils as nn
+
+nn_path = main_path + '/framework/inference/neuralNetworks'
+batch_sizes = [1, 8, 32]
+repetitions = 50
+
+def time_predict(predict, batch:np.ndarray):
+    predict(batch)
+    timings = []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        predict(batch)
+        timings.append(time.perf_counter() - start)
+    return np.median(timings) * 1000
+
+##########
+#  Main  #
+##########
+parser = argparse.ArgumentParser(description='Compare the latency of a k-fold ensemble graph against one fold and against one predict per fold')
+parser.add_argument('name', help='Ensemble neural network (folder with ensemble.json and one subfolder per fold) in framework/inference/neuralNetworks')
+args = parser.parse_args()
+
+app = Flask(__name__)
+ensemble = nn.load_ensemble_network(app, args.name, nn_path)
+with open(nn.ensemble_path(args.name, nn_path)) as f:
+    ensemble_cfg = json.load(f)
+folds = ensemble_cfg.get("folds")
+folder = nn_path + '/' + args.name
+folds = folds or sorted(fold for fold in next(os.walk(folder))[1] if os.path.exists(folder + '/' + fold + '/model.json'))
+models = [nn.load_nueral_network(app, fold, folder) for fold in folds]
+input_shape = tuple(ensemble.input_shape[1:])
+
+print(str(len(models)) + ' folds, input ' + str(input_shape))
+print('{:>6} {:>16} {:>22} {:>24} {:>14}'.format('batch', 'one fold (ms)', 'ensemble graph (ms)', 'predict per fold (ms)', 'max diff'))
+for batch_size in batch_sizes:
+    batch = np.random.rand(batch_size, *input_shape).astype(np.float32)
+    single = time_predict(lambda x: models[0].predict(x, batch_size=len(x), verbose=0), batch)
+    graph = time_predict(lambda x: ensemble.predict(x, batch_size=len(x), verbose=0), batch)
+    separate = time_predict(lambda x: [model.predict(x, batch_size=len(x), verbose=0) for model in models], batch)
+    # With average the graph must match the mean of the separate predictions
+    difference = '-'
+    if ensemble_cfg["combine"] == "average":
+        expected = np.mean([model.predict(batch, batch_size=batch_size, verbose=0) for model in models], axis=0)
+        difference = '{:.2e}'.format(np.abs(ensemble.predict(batch, batch_size=batch_size, verbose=0) - expected).max())
+    print('{:>6} {:>16.2f} {:>22.2f} {:>24.2f} {:>14}'.format(batch_size, single, graph, separate, difference))
@@ -0,0 +1,54 @@
+import os, sys, json, time
+import numpy as np
+from flask import Flask
+
+# main_path = os.getcwd() + '/TFG'
+main_path = '/TFG'
+sys.path.append(main_path + '/framework/inference')
+import nnUtils as nn
+from slidingFFT import SlidingFFT, TOLERANCE
+
+examples_path = main_path + '/framework/inference/neuralNetworks/N5-250-28-9-1/examples/'
+config_path = main_path + '/framework/inference/config.json'
+hops = [1, 5, 25, 50, 125]
+
+##########
+#  Main  #
+##########
+app = Flask(__name__)
+with open(config_path) as f:
+    cfg = json.load(f)["LOCAL"]
+cfg_data = cfg["info"]
+rows = int(cfg_data["rows"])
+recompute_rows = int(cfg["sessions"]["fft-recompute-rows"])
+
+# Stream built by chaining the example windows
+recording = []
+for example in sorted(os.listdir(examples_path)):
+    with open(examples_path + example, 'rb') as f:
+        window = nn.parse_csv_window(app, f.read(), cfg_data)
+    if str(window) != nn.ERROR:
+        recording.append(window)
+recording = np.concatenate(recording)
+print('Stream of ' + str(len(recording)) + ' rows, window of ' + str(rows) + ' rows, full recompute every ' + str(recompute_rows) + ' rows')
+
+print('{:>6} {:>18} {:>18} {:>10} {:>16}'.format('hop', 'sliding (ms/hop)', 'fft2 (ms/hop)', 'speedup', 'max rel. error'))
+for hop in hops:
+    sliding = SlidingFFT(rows, recording.shape[1], recompute_rows)
+    sliding.push(recording[:rows])
+    sliding_timings = []
+    full_timings = []
+    max_error = 0
+    for end in range(rows + hop, len(recording) + 1, hop):
+        start = time.perf_counter()
+        sliding.push(recording[end - hop:end])
+        features = sliding.features()
+        sliding_timings.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        expected = nn.calculate_FFT(recording[end - rows:end])
+        full_timings.append(time.perf_counter() - start)
+        max_error = max(max_error, np.abs(features - expected).max() / np.abs(expected).max())
+    sliding_ms = np.median(sliding_timings) * 1000
+    full_ms = np.median(full_timings) * 1000
+    status = 'OK' if max_error <= TOLERANCE else 'OVER TOLERANCE'
+    print('{:>6} {:>18.3f} {:>18.3f} {:>9.1f}x {:>16.2e} {}'.format(hop, sliding_ms, full_ms, full_ms / sliding_ms, max_error, status))
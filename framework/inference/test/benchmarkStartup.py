@@ -0,0 +1,46 @@
+import sys, json, time, subprocess, argparse
+import numpy as np
+
+# main_path = os.getcwd() + '/TFG'
+main_path = '/TFG'
+sys.path.append(main_path + '/framework/inference')
+nn_path = main_path + '/framework/inference/neuralNetworks'
+
+# Loads and warms one neural network in this (new) process and prints the timings
+def measure(mode:str, name:str):
+    from flask import Flask
+    app = Flask(__name__)
+    start = time.perf_counter()
+    import nnUtils as nn
+    imported = time.perf_counter()
+    if mode == 'artifact':
+        nn.load_artifact_network(app, name, nn_path)
+    else:
+        model = nn.load_nueral_network(app, name, nn_path)
+        model.predict(np.zeros((1,) + tuple(model.input_shape[1:]), dtype=np.float32))
+    print(json.dumps({'import': imported - start, 'load': time.perf_counter() - imported}))
+
+# Every run uses a new process so that both paths start cold
+def run(mode:str, name:str):
+    output = subprocess.run([sys.executable, __file__, name, '--measure', mode], capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+##########
+#  Main  #
+##########
+parser = argparse.ArgumentParser(description='Compare the startup time of model.json + best_weights against model.artifact')
+parser.add_argument('name', help='Neural network with both formats in framework/inference/neuralNetworks')
+parser.add_argument('--runs', type=int, default=5)
+parser.add_argument('--measure', help=argparse.SUPPRESS)
+args = parser.parse_args()
+
+if args.measure:
+    measure(args.measure, args.name)
+else:
+    print('{:<12} {:>18} {:>24}'.format('Format', 'import (s)', 'load + warm-up p50 (s)'))
+    results = {}
+    for mode in ['legacy', 'artifact']:
+        timings = [run(mode, args.name) for _ in range(args.runs)]
+        results[mode] = np.median([timing['load'] for timing in timings])
+        print('{:<12} {:>18.3f} {:>24.3f}'.format(mode, np.median([timing['import'] for timing in timings]), results[mode]))
+    print('Artifact startup is ' + str(round(results['legacy'] / results['artifact'], 1)) + 'x faster')
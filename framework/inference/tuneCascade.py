@@ -0,0 +1,109 @@
+# tuneCascade.py - replays a labelled test set through a cascade of neural networks to choose its threshold
+import os, sys, json, time, argparse
+import numpy as np
+from flask import Flask
+import nnUtils as nn
+
+# main_path = os.getcwd() + '/TFG'
+main_path = '/TFG'
+nn_path = main_path + '/framework/inference/neuralNetworks'
+config_path = main_path + '/framework/inference/config.json'
+server_env = os.environ.get('ENV') or "LOCAL"
+
+# Same order as the server: artifact, info.json and, for the default neural network, info in config.json
+def load_stage(app, name:str, default_info:dict):
+    if os.path.exists(nn.artifact_path(name, nn_path)):
+        model = nn.load_artifact_network(app, name, nn_path)
+        return model, model.info
+    info = nn.load_network_info(name, nn_path) or default_info
+    return nn.load_nueral_network(app, name, nn_path), info
+
+# Windows of the test set with their label (the movement in the file name, as in the training datasets)
+def load_test_set(app, test_path:str, info:dict):
+    windows = []
+    labels = []
+    for file in sorted(os.listdir(test_path)):
+        movement = file.split('-')[1]
+        if movement not in info["movementsList"]:
+            continue
+        with open(test_path + '/' + file, 'rb') as f:
+            window = nn.parse_csv_window(app, f.read(), info)
+        if str(window) != nn.ERROR and window.shape[1] == int(info["columns"]):
+            windows.append(window)
+            labels.append(info["movementsList"].index(movement))
+    return np.asarray(windows, dtype=np.float32), np.asarray(labels)
+
+# Softmax output of every window and median latency (s) of one window (FFT included)
+def replay(model, info:dict, windows:np.ndarray, latency_samples:int):
+    outputs = model.predict(nn.process_input_batch(info, windows))
+    timings = []
+    for window in windows[:latency_samples]:
+        start = time.perf_counter()
+        model.predict(nn.process_input_batch(info, window[np.newaxis]))
+        timings.append(time.perf_counter() - start)
+    return outputs, float(np.median(timings))
+
+# Accuracy and expected latency of the cascade: every window pays the stages it reaches
+def simulate(outputs:list, latencies:list, labels:np.ndarray, threshold:float):
+    predictions = np.argmax(outputs[-1], axis=1)
+    pending = np.ones(len(labels), dtype=bool)
+    latency = 0.0
+    reached = []
+    for depth, output in enumerate(outputs):
+        reached.append(pending.mean())
+        latency = latency + pending.mean() * latencies[depth]
+        if depth == len(outputs) - 1:
+            break
+        answered = pending & (output.max(axis=1) >= threshold)
+        predictions[answered] = np.argmax(output[answered], axis=1)
+        pending = pending & ~answered
+    return float(np.mean(predictions == labels)), latency, reached
+
+##########
+#  Main  #
+##########
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Choose the threshold of a cascade of neural networks by its accuracy/latency trade-off')
+    parser.add_argument('test', help='Folder with the labelled test windows (.csv named like the training dataset)')
+    parser.add_argument('--stages', nargs='+', help='Neural networks from the smallest to the largest (cascade.stages by default)')
+    parser.add_argument('--max-accuracy-drop', type=float, default=0.005, help='Accuracy that can be lost against the largest neural network')
+    parser.add_argument('--latency-samples', type=int, default=50, help='Windows predicted one by one to measure the latency')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    with open(config_path) as f:
+        cfg = json.load(f)[server_env]
+    stages = args.stages or cfg["cascade"]["stages"]
+    if len(stages) == 0:
+        sys.exit('No neural networks for the cascade: use --stages or set cascade.stages')
+    models = [load_stage(app, name, cfg["info"]) for name in stages]
+    info = models[0][1]
+    if any(stage_info is None or stage_info["movementsList"] != info["movementsList"] or stage_info["rows"] != info["rows"]
+           or stage_info["columns"] != info["columns"] for _, stage_info in models):
+        sys.exit('The neural networks of the cascade do not share their window shape and movements')
+    windows, labels = load_test_set(app, args.test, info)
+    if len(windows) == 0:
+        sys.exit('No labelled window of ' + args.test + ' matches the neural networks')
+
+    outputs = []
+    latencies = []
+    for name, (model, stage_info) in zip(stages, models):
+        output, latency = replay(model, stage_info, windows, args.latency_samples)
+        outputs.append(output)
+        latencies.append(latency)
+        print('{:<24} accuracy {:.4f}   latency {:.3f} ms'.format(name, np.mean(np.argmax(output, axis=1) == labels), latency * 1000))
+    target = np.mean(np.argmax(outputs[-1], axis=1) == labels) - args.max_accuracy_drop
+
+    print('\n' + str(len(windows)) + ' windows. Share of the windows reaching each stage: ' + ', '.join(stages))
+    print('{:>10} {:>10} {:>14}   {}'.format('threshold', 'accuracy', 'latency (ms)', 'reached'))
+    best = None
+    for threshold in np.round(np.arange(0.5, 1.0, 0.01), 2):
+        accuracy, latency, reached = simulate(outputs, latencies, labels, threshold)
+        print('{:>10.2f} {:>10.4f} {:>14.3f}   {}'.format(threshold, accuracy, latency * 1000, ' '.join('{:.2f}'.format(share) for share in reached)))
+        if accuracy >= target and (best is None or latency < best[2]):
+            best = (threshold, accuracy, latency)
+    if best is None:
+        print('\nNo threshold keeps the accuracy within ' + str(args.max_accuracy_drop) + ' of ' + stages[-1])
+    else:
+        print('\nSuggested "threshold": ' + str(best[0]) + ' (accuracy {:.4f}, {:.3f} ms per window against {:.3f} ms of {})'.format(
+            best[1], best[2] * 1000, latencies[-1] * 1000, stages[-1]))
@@ -2,6 +2,8 @@ import train
 import os, json, gc
 import numpy as np
 import utils.utils as utils
+import utils.packedDataset as packedDataset
+from utils.windowCache import WindowCache
 
 # main_path = os.getcwd()
 main_path = '/TFG'
@@ -13,14 +15,14 @@ files.remove('.gitkeep')
 ############################################################
 #  AUXILIAR FUNCION TO MANAGE KFOLD OR INDEPENDENT TRAINS  #
 ############################################################
-def train_all_files(input_directory_path:str, outcome_directory_path:str, file:str):
+def train_all_files(input_directory_path:str, outcome_directory_path:str, file:str, cache=None):
     # Clean garbage & load configuration file
     gc.collect()
     outcome_path = utils.create_folder(outcome_directory_path)
     cfg = utils.loadCfgJson(input_directory_path + '/' + file)
 
     # Train phase
-    model, test_loss, test_accuracy, prediction, history_callback = train.train_main(cfg, outcome_path)
+    model, test_loss, test_accuracy, prediction, history_callback = train.train_main(cfg, outcome_path, cache)
 
     # Generate report
     utils.save_model_and_weights(outcome_path, model)
@@ -28,6 +30,30 @@ def train_all_files(input_directory_path:str, outcome_directory_path:str, file:s
     utils.create_outcome_file(outcome_path, model, test_loss, test_accuracy, history_callback, cfg["comments"])
     utils.create_config_output_file(outcome_path, cfg)
 
+# Windows of every fold decoded once, if all the configuration files of the K-fold enable kfold-cache.
+# They are copied from the packed dataset if every configuration file reads it, else decoded from the csv files
+def load_kfold_cache(input_directory_path:str, outcome_directory_path:str, kFoldFiles:list):
+    cfgs = [utils.loadCfgJson(input_directory_path + '/' + file) for file in kFoldFiles]
+    if not cfgs or not all(cfg.get("kfold-cache", False) for cfg in cfgs):
+        return None
+    packed = None
+    listing = train.files
+    if all(utils.extract_pipeline_info_from_config(cfg)[0] == "packed" for cfg in cfgs):
+        packed = packedDataset.PackedDataset(train.packed_input_path)
+        listing = packed.files()
+    if not listing:
+        raise ValueError('The K-fold cache of ' + input_directory_path + ' has no windows to read: '
+            + (train.packed_input_path + ' is empty' if packed is not None else train.final_input_path + ' has no csv files (use input-pipeline packed for a packed dataset)'))
+    files = set()
+    for cfg in cfgs:
+        for split in utils.split_dataset(listing, cfg):
+            files.update(split)
+    cache = WindowCache(train.final_input_path, list(files), packed=packed)
+    print(cache.report())
+    with open(outcome_directory_path + '/kfold-cache.txt', 'w') as report:
+        report.write(cache.report() + '\n')
+    return cache
+
 ##########
 #  Main  #
 ##########
@@ -37,8 +63,11 @@ for folder in folders:
     kFold_input = cfg_files_path + '/' + folder
     kFold_outcome = utils.create_folder(outcome, folder)
     _, folders, kFoldFiles = next(os.walk(kFold_input))
+    cache = load_kfold_cache(kFold_input, kFold_outcome, kFoldFiles)
     for file in kFoldFiles:
-        train_all_files(kFold_input, kFold_outcome, file)
+        train_all_files(kFold_input, kFold_outcome, file, cache)
+    if cache is not None:
+        cache.close()
     utils.build_average_confusion_matrix(kFold_outcome)
     
 # Independent training configurations.
@@ -0,0 +1,60 @@
+# pack.py - packs the final dataset csv files into a few memory-mapped shards with a metadata index
+import os, sys, json, time, argparse
+from multiprocessing import Pool
+import numpy as np
+import pandas as pd
+import utils.utils as utils
+
+# main_path = os.getcwd()
+main_path = '/TFG'
+final_input_path = main_path + '/framework/final-dataset/orientation/'
+packed_output_path = main_path + '/framework/final-dataset/packed'
+
+##########
+#  Main  #
+##########
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pack the final dataset into float32 (or float16) shards read through memory maps')
+    parser.add_argument('--input', default=final_input_path, help='Folder with the csv windows (final-dataset/orientation by default)')
+    parser.add_argument('--output', default=packed_output_path, help='Folder for the shards and their index (final-dataset/packed by default)')
+    parser.add_argument('--dtype', default='float32', choices=['float32', 'float16'])
+    parser.add_argument('--shard-size-mb', type=int, default=256, help='Maximum size of a shard')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Processes parsing the csv files')
+    args = parser.parse_args()
+
+    start = time.time()
+    _, _, files = next(os.walk(args.input))
+    files = sorted(file for file in files if file.endswith('.csv'))
+    if not files:
+        sys.exit('No csv file in ' + args.input)
+    header = list(pd.read_csv(args.input + '/' + files[0], nrows=0).columns)
+    rows = len(utils.read_csv_window(args.input + '/' + files[0]))
+    dtype = np.dtype(args.dtype)
+    shard_windows = max(1, args.shard_size_mb * 1024 * 1024 // (rows * len(header) * dtype.itemsize))
+    os.makedirs(args.output, exist_ok=True)
+
+    index = pd.DataFrame([utils.parse_file_name(file) for file in files])
+    index['shard'] = np.arange(len(files)) // shard_windows
+    index['offset'] = np.arange(len(files)) % shard_windows
+    shards = []
+    with Pool(args.workers) as pool:
+        windows = pool.imap(utils.read_csv_window, [args.input + '/' + file for file in files], chunksize=64)
+        for shard in range(int(index['shard'].max()) + 1):
+            count = int((index['shard'] == shard).sum())
+            name = 'shard-' + str(shard).zfill(4) + '.npy'
+            data = np.lib.format.open_memmap(args.output + '/' + name, mode='w+', dtype=dtype, shape=(count, rows, len(header)))
+            for offset in range(count):
+                window = next(windows)
+                if window.shape != (rows, len(header)):
+                    sys.exit(files[shard * shard_windows + offset] + ' is ' + str(window.shape) + ', expected ' + str((rows, len(header))))
+                data[offset] = window
+            data.flush()
+            del data
+            shards.append({'file': name, 'windows': count})
+            print(name + ': ' + str(count) + ' windows')
+
+    index.to_csv(args.output + '/index.csv', index=False)
+    with open(args.output + '/metadata.json', 'w') as f:
+        json.dump({'rows': rows, 'columns': len(header), 'header': header, 'dtype': args.dtype, 'shards': shards}, f, indent=3)
+    size = sum(os.path.getsize(args.output + '/' + shard['file']) for shard in shards)
+    print('Packed ' + str(len(files)) + ' windows (' + str(round(size / 1024 / 1024, 1)) + ' MB) in ' + str(round(time.time() - start, 1)) + ' s')
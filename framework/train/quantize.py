@@ -0,0 +1,106 @@
+# quantize.py - post-training quantization of a trained neural network with a latency/accuracy report
+import os, sys, time, argparse
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+from keras.models import model_from_json
+import utils.utils as utils
+
+# main_path = os.getcwd()
+main_path = '/TFG'
+final_input_path = main_path + '/framework/final-dataset/orientation/'
+latency_runs = 200
+
+def load_trained_model(outcome_path:str):
+    with open(outcome_path + '/model.json', 'r') as json_file:
+        model = model_from_json(json_file.read())
+    if os.path.exists(outcome_path + '/best_weights.index'):
+        model.load_weights(outcome_path + '/best_weights')
+    else:
+        model.load_weights(outcome_path + '/model.h5')
+    return model
+
+# Windows and labels read the same way as the one dimensional data generator
+def load_windows(files:list, movements:list, rows:int, columns:int, channels:int):
+    data = []
+    labels = []
+    for file in files:
+        activity = file.split('-')[1]
+        if activity in movements:
+            data.append(pd.read_csv(final_input_path + file).values.reshape(rows, columns, channels))
+            labels.append(movements.index(activity))
+    return np.asarray(data, dtype=np.float32), np.asarray(labels)
+
+def convert(model, calibration_windows:np.ndarray, mode:str):
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if mode != 'float':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if mode == 'int8':
+        # Weights and activations in int8, input and output stay float32 so the API feeds the same windows
+        converter.representative_dataset = lambda: ([window[np.newaxis]] for window in calibration_windows)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    return converter.convert()
+
+def tflite_predict(interpreter, window:np.ndarray):
+    input_details = interpreter.get_input_details()[0]
+    output_details = interpreter.get_output_details()[0]
+    interpreter.set_tensor(input_details['index'], window[np.newaxis])
+    interpreter.invoke()
+    return interpreter.get_tensor(output_details['index'])[0]
+
+# Single window latency (p50, p99 in ms) and test accuracy of a prediction function
+def evaluate(predict, test_windows:np.ndarray, test_labels:np.ndarray):
+    predicted = np.array([np.argmax(predict(window)) for window in test_windows])
+    accuracy = float(np.mean(predicted == test_labels))
+    timings = []
+    for i in range(latency_runs):
+        window = test_windows[i % len(test_windows)]
+        start = time.perf_counter()
+        predict(window)
+        timings.append(time.perf_counter() - start)
+    return np.percentile(timings, 50) * 1000, np.percentile(timings, 99) * 1000, accuracy
+
+def model_size(outcome_path:str):
+    if os.path.exists(outcome_path + '/best_weights.index'):
+        return sum(os.path.getsize(outcome_path + '/' + file) for file in os.listdir(outcome_path) if file.startswith('best_weights'))
+    return os.path.getsize(outcome_path + '/model.h5')
+
+##########
+#  Main  #
+##########
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Quantize a trained neural network and compare it with the float version')
+    parser.add_argument('outcome', help='Training outcome folder (model.json, best_weights or model.h5 and config.json)')
+    parser.add_argument('--calibration-samples', type=int, default=200, help='Training windows used to calibrate the int8 model')
+    args = parser.parse_args()
+
+    cfg = utils.loadCfgJson(args.outcome + '/config.json')
+    rows, columns, channels, movements = cfg["input-rows"], cfg["input-columns"], cfg["channels"], cfg["movements"]
+    if channels != 1:
+        sys.exit('Only one channel neural networks can be quantized')
+    _, _, files = next(os.walk(final_input_path))
+    train_set, _, test_set = utils.split_dataset(files, cfg)
+    np.random.shuffle(train_set)
+    calibration_windows, _ = load_windows(train_set[:args.calibration_samples], movements, rows, columns, channels)
+    test_windows, test_labels = load_windows(test_set, movements, rows, columns, channels)
+
+    model = load_trained_model(args.outcome)
+    results = {'keras float32': evaluate(lambda window: model.predict(window[np.newaxis])[0], test_windows, test_labels) + (model_size(args.outcome),)}
+    for mode in ['float', 'dynamic', 'int8']:
+        tflite_path = args.outcome + '/model-' + mode + '.tflite'
+        with open(tflite_path, 'wb') as tflite_file:
+            tflite_file.write(convert(model, calibration_windows, mode))
+        interpreter = tf.lite.Interpreter(model_path=tflite_path)
+        interpreter.allocate_tensors()
+        results['tflite ' + mode] = evaluate(lambda window: tflite_predict(interpreter, window), test_windows, test_labels) + (os.path.getsize(tflite_path),)
+
+    with open(args.outcome + '/quantization-report.txt', 'w') as file:
+        file.write('##################################################\n')
+        file.write('#              QUANTIZATION REPORT               #\n')
+        file.write('##################################################\n')
+        file.write('Calibration windows: ' + str(len(calibration_windows)) + ' | Test windows: ' + str(len(test_windows)) + '\n\n')
+        file.write('{:<16} {:>12} {:>12} {:>12} {:>10}\n'.format('Model', 'p50 (ms)', 'p99 (ms)', 'size (KB)', 'accuracy'))
+        for name, (p50, p99, accuracy, size) in results.items():
+            file.write('{:<16} {:>12.3f} {:>12.3f} {:>12.1f} {:>10.4f}\n'.format(name, p50, p99, size / 1024, accuracy))
+    with open(args.outcome + '/quantization-report.txt') as file:
+        print(file.read())
@@ -0,0 +1,51 @@
+import os, sys, time, argparse
+
+# main_path = os.getcwd()
+main_path = '/TFG'
+sys.path.append(main_path + '/framework/train')
+import tensorflow as tf
+import utils.utils as utils
+import utils.dataGenerator as datagen
+import utils.dataGenerator4D as datagen4D
+import utils.dataPipeline as pipeline
+
+final_input_path = main_path + '/framework/final-dataset/orientation/'
+movements = ["FigureofEight", "HighKneeJog", "Jog", "JumpingJacks", "SpeedSkater", "Static", "Zigzag", "Walk"]
+
+# Windows per second read from a dataset (the first batch, which builds the pipeline, is not timed)
+def throughput(dataset, batches:int):
+    iterator = iter(dataset)
+    next(iterator)
+    windows = 0
+    start = time.perf_counter()
+    for _ in range(batches):
+        data, _ = next(iterator)
+        windows = windows + int(data.shape[0])
+    return windows / (time.perf_counter() - start)
+
+##########
+#  Main  #
+##########
+parser = argparse.ArgumentParser(description='Compare the input throughput (windows/s) of the python data generators and the tf.data pipeline')
+parser.add_argument('--input', default=final_input_path, help='Folder with the csv windows (final-dataset/orientation by default)')
+parser.add_argument('--rows', type=int, default=250)
+parser.add_argument('--columns', type=int, default=28)
+parser.add_argument('--channels', type=int, default=1, choices=[1, 4])
+parser.add_argument('--batch-sizes', type=int, nargs='+', default=[16, 32, 64])
+parser.add_argument('--batches', type=int, default=50, help='Batches read for each measure')
+args = parser.parse_args()
+
+_, _, files = next(os.walk(args.input))
+files = [file for file in files if file.split('-')[1:2] and file.split('-')[1] in movements]
+columns = args.columns // 4 if args.channels == 4 else args.columns
+generator = datagen4D.tf_data_generator if args.channels == 4 else datagen.tf_data_generator
+labels = utils.movement_labels(files, movements)
+print(str(len(files)) + ' files, ' + str(os.cpu_count()) + ' cores')
+print('{:>6} {:>20} {:>20} {:>10}'.format('batch', 'generator (win/s)', 'tf.data (win/s)', 'speedup'))
+for batch_size in args.batch_sizes:
+    generator_dataset = tf.data.Dataset.from_generator(generator, args=[args.input, files, labels, batch_size, args.rows, columns, ""],
+        output_types=(tf.float32, tf.float32), output_shapes=((None, args.rows, columns, args.channels), (None,)))
+    pipeline_dataset = pipeline.tf_data_pipeline(args.input, files, labels, batch_size, args.rows, columns, args.channels)
+    old = throughput(generator_dataset, args.batches)
+    new = throughput(pipeline_dataset, args.batches)
+    print('{:>6} {:>20.1f} {:>20.1f} {:>9.2f}x'.format(batch_size, old, new, new / old))
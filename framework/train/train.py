@@ -1,4 +1,5 @@
 import utils.utils as utils
+import utils.packedDataset as packedDataset
 import tensorflow as tf 
 import re, os, json
 import importlib
@@ -6,26 +7,46 @@ import importlib
 # main_path = os.getcwd()
 main_path = '/TFG'
 final_input_path = main_path + '/framework/final-dataset/orientation/'
-_, _, files = next(os.walk(final_input_path))
+packed_input_path = main_path + '/framework/final-dataset/packed'
+# The csv files can be removed once packed (see pack.py)
+files = next(os.walk(final_input_path))[2] if os.path.isdir(final_input_path) else []
+# File names parsed once per dataset version and reused by every split (see utils/manifest.py)
+if files:
+  utils.load_manifest(files, main_path + '/framework/final-dataset/manifest')
 
 #########################
 #  Main train function  #
 #########################
-def train_main(cfg: json, outcome_path:str):
+# cache: windows of every file of the k-fold (see windowCache.py), None to read them with the configured input pipeline
+def train_main(cfg: json, outcome_path:str, cache=None):
 
 # Load configuration data
   rows, columns, channels, movements, batch_size, train_steps, validation_steps, test_steps, epochs = utils.extract_info_from_config(cfg)
 
 # Create filenames lists for datasets
-  train_set, validation_set, test_set = utils.split_dataset(files, cfg)
+  input_pipeline, shuffle_buffer, parallel_calls = utils.extract_pipeline_info_from_config(cfg)
+  if input_pipeline == "packed":
+    packed = packedDataset.PackedDataset(packed_input_path)
+    train_set, validation_set, test_set = utils.split_dataset(packed.files(), cfg)
+  else:
+    train_set, validation_set, test_set = utils.split_dataset(files, cfg)
 
 # # Balance datasets
 #   train_set = utils.balance_data_set(train_set, cfg, "training")
 #   validation_set = utils.balance_data_set(validation_set, cfg, "validation")
 #   test_set = utils.balance_data_set(test_set, cfg, "test")
 
-# Create datasets from tensorflow custom data generators
-  if channels == 1:
+# Create datasets from the tensorflow input pipeline, the packed dataset or the custom data generators
+  if cache is not None:
+    train_dataset, test_dataset, test_dataset_prediction, validation_dataset = \
+      utils.load_indexed_datasets(cache, train_set, test_set, validation_set, batch_size, movements, rows, columns, channels, outcome_path)
+  elif input_pipeline == "packed":
+    train_dataset, test_dataset, test_dataset_prediction, validation_dataset = \
+      utils.load_indexed_datasets(packed, train_set, test_set, validation_set, batch_size, movements, rows, columns, channels, outcome_path)
+  elif input_pipeline == "tf-data":
+    train_dataset, test_dataset, test_dataset_prediction, validation_dataset = \
+      utils.load_tf_data_datasets(final_input_path, train_set, test_set, validation_set, batch_size, movements, rows, columns, channels, outcome_path, test_steps, shuffle_buffer, parallel_calls)
+  elif channels == 1:
     train_dataset, test_dataset, test_dataset_prediction, validation_dataset = \
     utils.load_one_dimension_datasets(final_input_path, train_set, test_set, validation_set, batch_size, movements, rows, columns, channels, outcome_path)
   elif channels == 4:
@@ -0,0 +1,50 @@
+import re
+import csv
+import tensorflow as tf
+import numpy as np
+import pandas as pd
+# This function builds a native tensorflow input pipeline: the csv files are read and decoded in parallel,
+# shuffled with a bounded buffer, batched and prefetched while the model trains
+
+def tf_data_pipeline(input_path:str, file_list:list, label_list:np.ndarray, batch_size:int, rows:int, columns:int, channels:int,
+                     shuffle:bool=True, shuffle_buffer:int=1024, parallel_calls:int=tf.data.AUTOTUNE):
+    files, labels = label_files(file_list, label_list)
+    decode = decode_function(input_path + files[0], rows, columns, channels)
+    dataset = tf.data.Dataset.from_tensor_slices(([input_path + file for file in files], labels))
+    if shuffle:
+        dataset = dataset.shuffle(shuffle_buffer, reshuffle_each_iteration=True)
+    dataset = dataset.repeat()
+    dataset = dataset.map(lambda path, label: (decode(path), label), num_parallel_calls=parallel_calls, deterministic=not shuffle)
+    return dataset.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
+# Files with a known movement (label_list from utils.movement_labels, -1 for the rest) and their labels
+def label_files(file_list:list, label_list:np.ndarray):
+    files = [file for file, label in zip(file_list, label_list) if label >= 0]
+    return files, label_list[label_list >= 0].astype(np.float32)
+
+# Labels of the windows predicted in steps batches of a not shuffled pipeline, written to output_path
+# in the format of the data generators (read by utils.create_confusion_matrix)
+def write_prediction_labels(file_list:list, label_list:np.ndarray, batch_size:int, steps:int, output_path:str):
+    _, labels = label_files(file_list, label_list)
+    labels = np.resize(labels.astype(int), steps * batch_size)
+    with open(output_path, 'a') as f:
+        wtr = csv.writer(f, delimiter =',')
+        for i in range(steps):
+            wtr.writerow ([labels[i*batch_size:(i+1)*batch_size]], )
+
+# Graph function that reads one csv into a (rows, columns, channels) float32 window, as the data generators do.
+# With four channels the columns of each quaternion component are selected by name like in dataGenerator4D
+def decode_function(sample_path:str, rows:int, columns:int, channels:int):
+    header = list(pd.read_csv(sample_path, nrows=0).columns)
+    if channels == 4:
+        components = [[i for i, name in enumerate(header) if re.search(regex, name)] for regex in ['0.*$', '-1.*$', '-2.*$', '-3.*$']]
+    def decode(path):
+        content = tf.strings.regex_replace(tf.io.read_file(path), '\r', '')
+        body = tf.strings.split(tf.strings.strip(content), '\n', maxsplit=1)[1]
+        values = tf.strings.to_number(tf.strings.split(tf.strings.regex_replace(body, '\n', ','), ','), out_type=tf.float64)
+        window = tf.reshape(tf.cast(values, tf.float32), (rows, len(header)))
+        if channels == 4:
+            stacked = tf.stack([tf.gather(window, component, axis=1) for component in components])
+            return tf.reshape(stacked, (rows, len(components[0]), 4))
+        return tf.reshape(window, (rows, columns, channels))
+    return decode
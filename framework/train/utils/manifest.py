@@ -0,0 +1,96 @@
+import os, re, json, hashlib
+import numpy as np
+import pandas as pd
+# Manifest of a dataset listing: the fields of every file name parsed once into columns, and the result of each
+# regular expression used to select files (subject, movement, original...) cached as a boolean mask aligned with
+# the listing. Splitting and balancing combine those masks instead of scanning the listing again
+
+# Manifests already built in this process, by listing version
+manifests = {}
+
+# Fields of a dataset file name: subject-movement-(...)-sample-window-rotation.csv. Names with less
+# fields leave sample and window empty. original follows the r'-0.csv$' rule of split_dataset
+def parse_file_name(file:str):
+    name = file.split('/')[-1]
+    pieces = (name[:-4] if name.endswith('.csv') else name).split('-')
+    return {
+        'file': file,
+        'subject': pieces[0],
+        'movement': pieces[1] if len(pieces) > 1 else '',
+        'sample': pieces[-3] if len(pieces) > 4 else '',
+        'window': pieces[-2] if len(pieces) > 3 else '',
+        'rotation': pieces[-1] if len(pieces) > 2 else '',
+        'original': re.search(r'-0.csv$', file) is not None
+    }
+
+# Index in movements of the activity of every file (the movement column of the manifest), -1 if it is not one of them
+def movement_labels(files:list, movements:list):
+    return manifest_of(files).labels(files, movements)
+
+# The version changes with any file added, removed or renamed (and with the listing order, which the masks follow)
+def listing_version(files:list):
+    return hashlib.blake2b('\n'.join(files).encode(), digest_size=16).hexdigest()
+
+class Manifest:
+    def __init__(self, table:pd.DataFrame):
+        self.table = table
+        self.files = table['file'].to_numpy(dtype=object)
+        self.positions = dict(zip(self.files, range(len(self.files))))
+        self.movements = table['movement'].to_numpy(dtype=object)
+        self.masks = {}
+
+    # Files matching regex (re.search, as utils.filter_files_by_regex), computed once per expression
+    def mask(self, regex:str):
+        mask = self.masks.get(regex)
+        if mask is None:
+            mask = self.masks[regex] = pd.Series(self.files, dtype=object).str.contains(regex, regex=True).values.astype(bool)
+        return mask
+
+    # Files matching any of the expressions, as re.search of their alternation '(a|b|...)' would
+    def any_mask(self, regexes:list):
+        mask = np.zeros(len(self.files), dtype=bool)
+        for regex in regexes:
+            mask = mask | self.mask(regex)
+        return mask
+
+    # Boolean mask of a subset of the files (in its own order) from a mask of the whole listing
+    def subset(self, files:list, mask:np.ndarray):
+        return mask[[self.positions[file] for file in files]]
+
+    # Activity (movement field of the name) of a subset of the files
+    def activities(self, files:list):
+        return self.movements[[self.positions[file] for file in files]]
+
+    # Index in movements of the activity of a subset of the files, -1 if it is not one of them
+    def labels(self, files:list, movements:list):
+        lookup = {movement: label for label, movement in enumerate(movements)}
+        return np.asarray([lookup.get(activity, -1) for activity in self.activities(files)], dtype=np.int64)
+
+# Manifest already built for a listing that contains every file (e.g. for a split of it), or a new one
+def manifest_of(files:list):
+    for manifest in reversed(list(manifests.values())):
+        if all(file in manifest.positions for file in files):
+            return manifest
+    return load_manifest(files)
+
+# Manifest of a listing. With path, it is stored as path.csv (and its version in path.json) and reused
+# while the listing does not change
+def load_manifest(files:list, path:str=None):
+    version = listing_version(files)
+    manifest = manifests.get(version)
+    if manifest is not None:
+        return manifest
+    table = None
+    if path is not None and os.path.exists(path + '.json') and os.path.exists(path + '.csv'):
+        with open(path + '.json') as f:
+            if json.load(f).get('version') == version:
+                table = pd.read_csv(path + '.csv', dtype=str, keep_default_na=False)
+                table['original'] = table['original'] == 'True'
+    if table is None:
+        table = pd.DataFrame([parse_file_name(file) for file in files], columns=['file', 'subject', 'movement', 'sample', 'window', 'rotation', 'original'])
+        if path is not None:
+            table.to_csv(path + '.csv', index=False)
+            with open(path + '.json', 'w') as f:
+                json.dump({'version': version, 'files': len(files)}, f)
+    manifest = manifests[version] = Manifest(table)
+    return manifest
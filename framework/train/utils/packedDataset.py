@@ -0,0 +1,56 @@
+import re, json, csv
+import numpy as np
+import pandas as pd
+# Training windows read from the shards written by pack.py. Every shard is memory mapped, so
+# loading a batch only copies its windows out of the page cache instead of parsing csv files
+
+class PackedDataset:
+    def __init__(self, packed_path:str):
+        with open(packed_path + '/metadata.json') as f:
+            self.metadata = json.load(f)
+        self.index = pd.read_csv(packed_path + '/index.csv', dtype={'subject': str, 'movement': str, 'sample': str, 'window': str, 'rotation': str}, keep_default_na=False)
+        self.shards = [np.load(packed_path + '/' + shard['file'], mmap_mode='r') for shard in self.metadata["shards"]]
+        self.positions = dict(zip(self.index['file'], range(len(self.index))))
+
+    # File names of the packed windows, as listed in the csv folder
+    def files(self):
+        return list(self.index['file'])
+
+    # Windows (float32, rows x columns) of several files. Reads are grouped by shard in file order
+    def windows(self, files:list):
+        positions = np.asarray([self.positions[file] for file in files])
+        shard_ids = self.index['shard'].values[positions]
+        offsets = self.index['offset'].values[positions]
+        data = np.empty((len(files), self.metadata["rows"], self.metadata["columns"]), dtype=np.float32)
+        for shard in np.unique(shard_ids):
+            selected = np.flatnonzero(shard_ids == shard)
+            order = selected[np.argsort(offsets[selected])]
+            data[order] = self.shards[shard][offsets[order]]
+        return data
+
+# Same batches as the data generators (one or four channels), read from a packed dataset
+# (or from any other source of windows with the same windows and metadata, like WindowCache)
+def packed_generator(packed, file_list:list, label_list:np.ndarray, batch_size:int, rows:int, columns:int, channels:int, ouput_path:str):
+    files = [file for file, label in zip(file_list, label_list) if label >= 0]
+    labels = label_list[label_list >= 0]
+    if channels == 4:
+        header = packed.metadata["header"]
+        components = [[i for i, name in enumerate(header) if re.search(regex, name)] for regex in ['0.*$', '-1.*$', '-2.*$', '-3.*$']]
+    order = np.random.permutation(len(files))
+    i = 0
+    while True:
+        if i > 0 and (i+1)*batch_size > len(files):  # This loop is used to run the generator indefinitely.
+            i = 0
+            order = np.random.permutation(len(files))
+        chunk = order[i*batch_size:(i+1)*batch_size]
+        data = packed.windows([files[j] for j in chunk])
+        if channels == 4:
+            data = np.stack([data[:, :, component] for component in components], axis=1).reshape(-1, rows, len(components[0]), 4)
+        else:
+            data = data.reshape(-1, rows, columns, channels)
+        if (ouput_path):
+            with open(ouput_path, 'a') as f:
+                wtr = csv.writer(f, delimiter =',')
+                wtr.writerow ([labels[chunk]], )
+        yield data, labels[chunk]
+        i = i + 1
@@ -8,6 +8,9 @@ import seaborn as sn
 from string import ascii_uppercase
 import utils.dataGenerator as datagen
 import utils.dataGenerator4D as datagen4D
+import utils.dataPipeline as pipeline
+import utils.packedDataset as packedDataset
+from utils.manifest import load_manifest, manifest_of, parse_file_name, movement_labels
 
 metrics_index = ['Sensitivity', 'Specificity', 'Precision', 'Negative predictive value', 'Fall out', 'False negative rate', 'False discovery rate', 'Accuracy', 'F1 Score']
 
@@ -34,56 +37,74 @@ def build_regex_for_movement(movements:list):
 def extract_info_from_config(cfg:json):
     return cfg["input-rows"], cfg["input-columns"], cfg["channels"], cfg["movements"], cfg["batch-size"], cfg["train-steps"], cfg["validation-steps"], cfg["test-steps"], cfg["epochs"]
 
+# Input pipeline options. Configuration files without them keep the python data generators
+def extract_pipeline_info_from_config(cfg:json):
+    return cfg.get("input-pipeline", "generator"), cfg.get("shuffle-buffer", 1024), cfg.get("parallel-calls", tf.data.AUTOTUNE)
+
+# Same selection as filtering files with build_regex_for_subjects, build_regex_for_movement and r'-0.csv$',
+# from the masks of the manifest of the listing: each subject ('^' + subject) and movement is matched once
 def split_dataset(files:list, cfg:json):
-    movements_regex_string = build_regex_for_movement(cfg["movements"])
+    manifest = load_manifest(files)
+    movements_mask = manifest.any_mask(cfg["movements"])
+    original_mask = manifest.mask(r'-0.csv$')
     # Load train set
-    train_user_regex_string = build_regex_for_subjects(cfg["train-subjects"])
-    train_files = filter_files_by_regex(files, train_user_regex_string)
-    train_files = filter_files_by_regex(train_files, movements_regex_string)
+    train_mask = manifest.any_mask(['^' + subject for subject in cfg["train-subjects"]]) & movements_mask
     # Use only original files if desired
     if cfg["no-augmentation"]:
-        train_files = filter_files_by_regex(train_files, r'-0.csv$')
-
-    # Load test set
-    test_user_regex_string = build_regex_for_subjects(cfg["test-subjects"])
-    test_files = filter_files_by_regex(files, test_user_regex_string)
-    test_files = filter_files_by_regex(test_files, movements_regex_string)
-    # Use only original files for testing
-    test_files = filter_files_by_regex(test_files, r'-0.csv$')
-
-    # Load validation set
-    validation_user_regex_string = build_regex_for_subjects(cfg["validation-subjects"])
-    validation_files = filter_files_by_regex(files, validation_user_regex_string)
-    validation_files = filter_files_by_regex(validation_files, movements_regex_string)
-    # Use only original files for validation
-    validation_files = filter_files_by_regex(validation_files, r'-0.csv$')
-
-    print("Original train files: " + str(len(filter_files_by_regex(train_files, r'-0.csv$'))))
+        train_mask = train_mask & original_mask
+
+    # Load test set. Use only original files for testing
+    test_mask = manifest.any_mask(['^' + subject for subject in cfg["test-subjects"]]) & movements_mask & original_mask
+
+    # Load validation set. Use only original files for validation
+    validation_mask = manifest.any_mask(['^' + subject for subject in cfg["validation-subjects"]]) & movements_mask & original_mask
+
+    train_files = list(manifest.files[train_mask])
+    validation_files = list(manifest.files[validation_mask])
+    test_files = list(manifest.files[test_mask])
+
+    print("Original train files: " + str(int((train_mask & original_mask).sum())))
     print("Total train files: " + str(len(train_files)))
-    print("Original validation files: " + str(len(filter_files_by_regex(validation_files, r'-0.csv$'))))
+    print("Original validation files: " + str(int((validation_mask & original_mask).sum())))
     print("Total validation files: " + str(len(validation_files)))
-    print("Original test files: " + str(len(filter_files_by_regex(test_files, r'-0.csv$'))))
+    print("Original test files: " + str(int((test_mask & original_mask).sum())))
     print("Total test files: " + str(len(test_files)))
+    report_unknown_activities(train_files, cfg["movements"], "train")
+    report_unknown_activities(validation_files, cfg["movements"], "validation")
+    report_unknown_activities(test_files, cfg["movements"], "test")
 
     return train_files, validation_files, test_files
 
+# Files selected by the movements expression whose activity is not one of the movements (e.g. HighKneeJog
+# when only Jog is selected) have no label, so the datasets skip them
+def report_unknown_activities(files:list, movements:list, set:str):
+    manifest = manifest_of(files)
+    labels = manifest.labels(files, movements)
+    if (labels < 0).any():
+        activities = pd.Series(manifest.activities(files)[labels < 0]).value_counts()
+        print("WARNING: " + str(int((labels < 0).sum())) + " " + set + " files have an activity out of the movements list and will be skipped: "
+            + ", ".join(activity + " (" + str(count) + ")" for activity, count in activities.items()))
+
+# Files of a split (any subset of a listing with a manifest) by movement, counted from the movement column of the manifest
 def balance_data_set(files:list, cfg:json, set:str):
-    movement_samples = {}
-    for movement in cfg["movements"]:
-        movement_regex_string = re.compile(movement)
-        files_filtered = filter_files_by_regex(files, movement_regex_string)
-        movement_samples[movement] = len(files_filtered)
+    labels = manifest_of(files).labels(files, cfg["movements"])
+    files = np.asarray(files, dtype=object)
+    movement_masks = {movement: labels == label for label, movement in enumerate(cfg["movements"])}
+    movement_samples = {movement: int(mask.sum()) for movement, mask in movement_masks.items()}
     min_key = min(movement_samples, key=movement_samples.get)
     final_files = []
     print("Under balancing data-set by movement " + min_key + " with " +  str(movement_samples[min_key]) + " total files.")
     for movement in cfg["movements"]:
-        movement_regex_string = re.compile(movement)
-        files_filtered = filter_files_by_regex(files, movement_regex_string)
+        files_filtered = list(files[movement_masks[movement]])
         random.shuffle(files_filtered)
         final_files = final_files + files_filtered[:movement_samples[min_key]]
     print("Final " + set + " data-set has " + str(len(final_files)) + " images.")
     return final_files
 
+# One csv window as a float32 (rows x columns) array
+def read_csv_window(path:str):
+    return pd.read_csv(path).values.astype(np.float32)
+
 def loadCfgJson(file_path:str):
      with open(file_path) as f:
         return json.load(f)
@@ -296,16 +317,40 @@ def save_dataframe_as_heatMap(nparray:np.array, columNames:list, indexNames:list
 
 # Function to load datasets from one dimensional tensorflow custom data generator
 def load_one_dimension_datasets(final_input_path:str, train_set:list, test_set:list, validation_set:list, batch_size:int, movements:list, rows:int, columns:int, channels:int, outcome_path:str):
-    train_dataset = tf.data.Dataset.from_generator(datagen.tf_data_generator,args= [final_input_path, train_set, batch_size, movements, rows, columns, ""],output_types = (tf.float32, tf.float32), output_shapes = ((None,rows,columns,channels),(None,)))
-    test_dataset = tf.data.Dataset.from_generator(datagen.tf_data_generator,args= [final_input_path, test_set, batch_size, movements, rows, columns, ""],output_types = (tf.float32, tf.float32), output_shapes = ((None,rows,columns,channels),(None,)))
-    test_dataset_prediction = tf.data.Dataset.from_generator(datagen.tf_data_generator,args= [final_input_path, test_set, batch_size, movements, rows, columns, outcome_path + '/test.csv'],output_types = (tf.float32, tf.float32), output_shapes = ((None,rows,columns,channels),(None,)))
-    validation_dataset = tf.data.Dataset.from_generator(datagen.tf_data_generator,args= [final_input_path, validation_set, batch_size, movements, rows, columns, ""],output_types = (tf.float32, tf.float32), output_shapes = ((None,rows,columns,channels),(None,)))
+    # Labels resolved once per split, aligned with its files
+    train_labels, test_labels, validation_labels = movement_labels(train_set, movements), movement_labels(test_set, movements), movement_labels(validation_set, movements)
+    train_dataset = tf.data.Dataset.from_generator(datagen.tf_data_generator,args= [final_input_path, train_set, train_labels, batch_size, rows, columns, ""],output_types = (tf.float32, tf.float32), output_shapes = ((None,rows,columns,channels),(None,)))
+    test_dataset = tf.data.Dataset.from_generator(datagen.tf_data_generator,args= [final_input_path, test_set, test_labels, batch_size, rows, columns, ""],output_types = (tf.float32, tf.float32), output_shapes = ((None,rows,columns,channels),(None,)))
+    test_dataset_prediction = tf.data.Dataset.from_generator(datagen.tf_data_generator,args= [final_input_path, test_set, test_labels, batch_size, rows, columns, outcome_path + '/test.csv'],output_types = (tf.float32, tf.float32), output_shapes = ((None,rows,columns,channels),(None,)))
+    validation_dataset = tf.data.Dataset.from_generator(datagen.tf_data_generator,args= [final_input_path, validation_set, validation_labels, batch_size, rows, columns, ""],output_types = (tf.float32, tf.float32), output_shapes = ((None,rows,columns,channels),(None,)))
     return train_dataset, test_dataset, test_dataset_prediction, validation_dataset
 
 # Function to load datasets from four dimensional tensorflow custom data generator
 def load_four_dimension_datasets(final_input_path:str, train_set:list, test_set:list, validation_set:list, batch_size:int, movements:list, rows:int, columns:int, channels:int, outcome_path:str):
-    train_dataset = tf.data.Dataset.from_generator(datagen4D.tf_data_generator,args= [final_input_path, train_set, batch_size, movements, rows, columns, ""],output_types = (tf.float32, tf.float32), output_shapes = ((None,rows,columns,channels),(None,)))
-    test_dataset = tf.data.Dataset.from_generator(datagen4D.tf_data_generator,args= [final_input_path, test_set, batch_size, movements, rows, columns, ""],output_types = (tf.float32, tf.float32), output_shapes = ((None,rows,columns,channels),(None,)))
-    test_dataset_prediction = tf.data.Dataset.from_generator(datagen4D.tf_data_generator,args= [final_input_path, test_set, batch_size, movements, rows, columns, outcome_path + '/test.csv'],output_types = (tf.float32, tf.float32), output_shapes = ((None,rows,columns,channels),(None,)))
-    validation_dataset = tf.data.Dataset.from_generator(datagen4D.tf_data_generator,args= [final_input_path, validation_set, batch_size, movements, rows, columns, ""],output_types = (tf.float32, tf.float32), output_shapes = ((None,rows,columns,channels),(None,)))
+    # Labels resolved once per split, aligned with its files
+    train_labels, test_labels, validation_labels = movement_labels(train_set, movements), movement_labels(test_set, movements), movement_labels(validation_set, movements)
+    train_dataset = tf.data.Dataset.from_generator(datagen4D.tf_data_generator,args= [final_input_path, train_set, train_labels, batch_size, rows, columns, ""],output_types = (tf.float32, tf.float32), output_shapes = ((None,rows,columns,channels),(None,)))
+    test_dataset = tf.data.Dataset.from_generator(datagen4D.tf_data_generator,args= [final_input_path, test_set, test_labels, batch_size, rows, columns, ""],output_types = (tf.float32, tf.float32), output_shapes = ((None,rows,columns,channels),(None,)))
+    test_dataset_prediction = tf.data.Dataset.from_generator(datagen4D.tf_data_generator,args= [final_input_path, test_set, test_labels, batch_size, rows, columns, outcome_path + '/test.csv'],output_types = (tf.float32, tf.float32), output_shapes = ((None,rows,columns,channels),(None,)))
+    validation_dataset = tf.data.Dataset.from_generator(datagen4D.tf_data_generator,args= [final_input_path, validation_set, validation_labels, batch_size, rows, columns, ""],output_types = (tf.float32, tf.float32), output_shapes = ((None,rows,columns,channels),(None,)))
+    return train_dataset, test_dataset, test_dataset_prediction, validation_dataset
+
+# Function to load datasets from the native tensorflow input pipeline (one or four dimensions). Only the train set is shuffled
+def load_tf_data_datasets(final_input_path:str, train_set:list, test_set:list, validation_set:list, batch_size:int, movements:list, rows:int, columns:int, channels:int, outcome_path:str, test_steps:int, shuffle_buffer:int, parallel_calls:int):
+    train_labels, test_labels, validation_labels = movement_labels(train_set, movements), movement_labels(test_set, movements), movement_labels(validation_set, movements)
+    train_dataset = pipeline.tf_data_pipeline(final_input_path, train_set, train_labels, batch_size, rows, columns, channels, True, shuffle_buffer, parallel_calls)
+    test_dataset = pipeline.tf_data_pipeline(final_input_path, test_set, test_labels, batch_size, rows, columns, channels, False, shuffle_buffer, parallel_calls)
+    test_dataset_prediction = pipeline.tf_data_pipeline(final_input_path, test_set, test_labels, batch_size, rows, columns, channels, False, shuffle_buffer, parallel_calls)
+    validation_dataset = pipeline.tf_data_pipeline(final_input_path, validation_set, validation_labels, batch_size, rows, columns, channels, False, shuffle_buffer, parallel_calls)
+    pipeline.write_prediction_labels(test_set, test_labels, batch_size, test_steps, outcome_path + '/test.csv')
+    return train_dataset, test_dataset, test_dataset_prediction, validation_dataset
+
+# Function to load datasets from the windows of a packed dataset (see pack.py) or of a k-fold window cache (see windowCache.py)
+def load_indexed_datasets(packed, train_set:list, test_set:list, validation_set:list, batch_size:int, movements:list, rows:int, columns:int, channels:int, outcome_path:str):
+    output_signature = (tf.TensorSpec((None,rows,columns,channels), tf.float32), tf.TensorSpec((None,), tf.float32))
+    train_labels, test_labels, validation_labels = movement_labels(train_set, movements), movement_labels(test_set, movements), movement_labels(validation_set, movements)
+    train_dataset = tf.data.Dataset.from_generator(lambda: packedDataset.packed_generator(packed, train_set, train_labels, batch_size, rows, columns, channels, ""), output_signature = output_signature)
+    test_dataset = tf.data.Dataset.from_generator(lambda: packedDataset.packed_generator(packed, test_set, test_labels, batch_size, rows, columns, channels, ""), output_signature = output_signature)
+    test_dataset_prediction = tf.data.Dataset.from_generator(lambda: packedDataset.packed_generator(packed, test_set, test_labels, batch_size, rows, columns, channels, outcome_path + '/test.csv'), output_signature = output_signature)
+    validation_dataset = tf.data.Dataset.from_generator(lambda: packedDataset.packed_generator(packed, validation_set, validation_labels, batch_size, rows, columns, channels, ""), output_signature = output_signature)
     return train_dataset, test_dataset, test_dataset_prediction, validation_dataset
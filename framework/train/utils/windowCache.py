@@ -0,0 +1,56 @@
+import time, resource
+from multiprocessing import Pool, shared_memory
+import numpy as np
+import pandas as pd
+import utils.utils as utils
+# Windows of every file used by the folds of a k-fold directory, decoded once into one shared memory
+# float32 array. The train, validation and test sets of each fold only keep file names that are
+# looked up in the file to row index, so no window is decoded more than once for the whole k-fold.
+# With a packed dataset (see pack.py) the windows are copied from its shards instead of the csv files
+COPY_CHUNK = 4096
+
+class WindowCache:
+    def __init__(self, input_path:str, files:list, workers:int=None, packed=None):
+        start = time.time()
+        files = sorted(set(files))
+        if not files:
+            raise ValueError('No windows to cache: the k-fold does not select any file of ' + (input_path if packed is None else 'the packed dataset'))
+        if packed is None:
+            header = list(pd.read_csv(input_path + files[0], nrows=0).columns)
+            rows = len(utils.read_csv_window(input_path + files[0]))
+        else:
+            header, rows = packed.metadata["header"], packed.metadata["rows"]
+        self.metadata = {'rows': rows, 'columns': len(header), 'header': header}
+        self.positions = dict(zip(files, range(len(files))))
+        self.memory = shared_memory.SharedMemory(create=True, size=max(1, len(files) * rows * len(header) * 4))
+        self.data = np.ndarray((len(files), rows, len(header)), dtype=np.float32, buffer=self.memory.buf)
+        if packed is None:
+            self._decode(input_path, files, workers)
+        else:
+            for i in range(0, len(files), COPY_CHUNK):
+                self.data[i:i + COPY_CHUNK] = packed.windows(files[i:i + COPY_CHUNK])
+        self.load_time = time.time() - start
+        # Linux reports the maximum resident set size in KB
+        self.peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def _decode(self, input_path:str, files:list, workers:int):
+        rows, columns = self.metadata["rows"], self.metadata["columns"]
+        with Pool(workers) as pool:
+            for i, window in enumerate(pool.imap(utils.read_csv_window, [input_path + file for file in files], chunksize=64)):
+                if window.shape != (rows, columns):
+                    self.close()
+                    raise ValueError(files[i] + ' is ' + str(window.shape) + ', expected ' + str((rows, columns)))
+                self.data[i] = window
+
+    # Windows (float32, rows x columns) of several files
+    def windows(self, files:list):
+        return self.data[[self.positions[file] for file in files]]
+
+    def report(self):
+        return ('Window cache: ' + str(len(self.positions)) + ' windows (' + str(round(self.data.nbytes / 1024 / 1024, 1)) + ' MB) decoded in '
+            + str(round(self.load_time, 1)) + ' s. Peak memory: ' + str(round(self.peak_memory / 1024 / 1024, 1)) + ' MB')
+
+    def close(self):
+        del self.data
+        self.memory.close()
+        self.memory.unlink()